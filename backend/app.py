@@ -14,7 +14,8 @@ import re
 def setup_rag_system():
     """Setup RAG system with graceful fallback"""
     try:
-        from enhanced_rag_helper import rag_helper
+        from enhanced_rag_helper import get_rag_helper
+        rag_helper = get_rag_helper()
         print("✅ RAG system loaded")
         return rag_helper
     except Exception as e:
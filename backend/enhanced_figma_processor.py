@@ -9,12 +9,21 @@ This module provides advanced Figma image processing capabilities including:
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import os
 import base64
 import tempfile
 import io
+import re
+import hashlib
+import pickle
+import threading
+import logging
+from collections import OrderedDict, defaultdict
 from typing import Dict, List, Any, Optional, Tuple
+import dataclasses
 from dataclasses import dataclass
 from datetime import datetime
 from PIL import Image, ImageEnhance, ImageFilter
@@ -22,6 +31,73 @@ import pytesseract
 import cv2
 import numpy as np
 
+from tesseract_helper import tess_api
+
+logger = logging.getLogger(__name__)
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+_opencv_configured = False
+
+
+def _configure_opencv():
+    """
+    Enable OpenCV's SIMD paths and size its thread pool (OPENCV_NUM_THREADS overrides the
+    default of half the CPUs). Runs once, when the first processor is created, not at import.
+    """
+    global _opencv_configured
+    if _opencv_configured:
+        return
+    _opencv_configured = True
+    cv2.setUseOptimized(True)
+    cv2.setNumThreads(int(os.getenv('OPENCV_NUM_THREADS', max(1, (os.cpu_count() or 2) // 2))))
+    if 'libjpeg-turbo' not in cv2.getBuildInformation():
+        logger.warning("OpenCV was built without libjpeg-turbo - JPEG decoding will be slower")
+
+# Integer codes returned by classify_geo (0 = not a UI element)
+GEOMETRIC_ELEMENT_TYPES = (None, 'button', 'input_field', 'checkbox')
+
+
+def _classify_geo_loop(aspect_ratios, areas):
+    """Classify contours by shape; branch order matches the original cascade"""
+    codes = np.zeros(aspect_ratios.shape[0], dtype=np.int8)
+    for i in range(aspect_ratios.shape[0]):
+        ar = aspect_ratios[i]
+        area = areas[i]
+        if 2.0 < ar < 8.0 and 500.0 < area < 5000.0:
+            codes[i] = 1
+        elif 3.0 < ar < 10.0 and 300.0 < area < 3000.0:
+            codes[i] = 2
+        elif 0.8 < ar < 1.2 and 100.0 < area < 1000.0:
+            codes[i] = 3
+    return codes
+
+
+def _classify_geo_numpy(aspect_ratios, areas):
+    """Vectorized fallback for classify_geo when Numba is not installed"""
+    button = (2.0 < aspect_ratios) & (aspect_ratios < 8.0) & (500.0 < areas) & (areas < 5000.0)
+    input_field = (3.0 < aspect_ratios) & (aspect_ratios < 10.0) & (300.0 < areas) & (areas < 3000.0)
+    checkbox = (0.8 < aspect_ratios) & (aspect_ratios < 1.2) & (100.0 < areas) & (areas < 1000.0)
+    return np.select([button, input_field, checkbox], [1, 2, 3], default=0).astype(np.int8)
+
+
+classify_geo = njit(cache=True)(_classify_geo_loop) if NUMBA_AVAILABLE else _classify_geo_numpy
+
+# Process-lifetime memo of preprocessed screenshots, keyed by image URL
+_IMAGE_MEMO_SIZE = 8
+_image_memo = OrderedDict()
+_image_memo_lock = threading.Lock()
+
+# Same 3x3 kernel as PIL.ImageFilter.SMOOTH
+SMOOTH_KERNEL = np.array([[1, 1, 1], [1, 5, 1], [1, 1, 1]], dtype=np.float32) / 13.0
+
+# Structuring element used to close gaps in thresholded UI outlines
+MORPH_KERNEL = np.ones((3, 3), dtype=np.uint8)
+
 @dataclass
 class VisualElement:
     """Represents a visual element detected in Figma screenshots"""
@@ -31,6 +107,23 @@ class VisualElement:
     confidence: float
     properties: Dict[str, Any]
 
+def visual_elements_to_soa(visual_elements: List[VisualElement],
+                           fields: Tuple[str, ...] = ('types', 'x', 'y', 'w', 'h', 'conf', 'text')) -> Dict[str, np.ndarray]:
+    """Build a struct-of-arrays view of detected elements for vectorized counting (only the requested fields)"""
+    soa = {}
+    if 'types' in fields:
+        soa['types'] = np.array([e.element_type for e in visual_elements], dtype=str)
+    if any(field in fields for field in ('x', 'y', 'w', 'h')):
+        coords = np.array([e.coordinates for e in visual_elements], dtype=np.int64).reshape(len(visual_elements), 4)
+        for column, field in enumerate(('x', 'y', 'w', 'h')):
+            if field in fields:
+                soa[field] = coords[:, column]
+    if 'conf' in fields:
+        soa['conf'] = np.array([e.confidence for e in visual_elements], dtype=np.float64)
+    if 'text' in fields:
+        soa['text'] = np.array([e.text_content for e in visual_elements], dtype=str)
+    return soa
+
 @dataclass
 class FigmaImageAnalysis:
     """Results of Figma image analysis"""
@@ -46,6 +139,35 @@ class EnhancedFigmaProcessor:
     Enhanced Figma processor with image analysis capabilities
     """
     
+    # Per-element test templates: element_type -> (fallback label, templates)
+    _RECOMMENDATION_TEMPLATES = {
+        'button': ('button', (
+            "Test {t} click functionality",
+            "Verify {t} hover states"
+        )),
+        'input_field': ('input field', (
+            "Test {t} with valid data",
+            "Test {t} with invalid data",
+            "Verify {t} validation messages"
+        )),
+        'dropdown': ('dropdown', (
+            "Test {t} option selection",
+            "Verify {t} keyboard navigation"
+        ))
+    }
+    _MAPPING_TEMPLATES = {
+        'button': ('button', (
+            "Verify {t} is clickable",
+            "Test {t} visual feedback on hover",
+            "Validate {t} action triggers correctly"
+        )),
+        'input_field': ('input', (
+            "Test {t} accepts valid input",
+            "Test {t} rejects invalid input",
+            "Verify {t} placeholder text displays"
+        ))
+    }
+    
     def __init__(self, access_token: str = None):
         self.access_token = access_token or os.getenv('FIGMA_ACCESS_TOKEN')
         self.base_url = "https://api.figma.com/v1"
@@ -53,6 +175,19 @@ class EnhancedFigmaProcessor:
             'X-Figma-Token': self.access_token,
             'Content-Type': 'application/json'
         }
+        _configure_opencv()
+        
+        # Keep-alive session for Figma API and image CDN calls, retrying rate limits / gateway errors
+        self._session = requests.Session()
+        retry = Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 502, 503, 504),
+                      allowed_methods=frozenset({'GET'}), raise_on_status=False)
+        self._session.mount('https://', HTTPAdapter(max_retries=retry))
+        
+        # On-disk cache of complete analyses (keyed by file, node and lastModified)
+        self.cache_dir = os.getenv(
+            'FIGMA_ANALYSIS_CACHE_DIR',
+            os.path.join(os.path.expanduser('~'), '.cache', 'testforge', 'figma')
+        )
         
         # Configure OCR for better accuracy (simplified to avoid escape character issues)
         self.ocr_config = r'--oem 3 --psm 6'
@@ -80,6 +215,15 @@ class EnhancedFigmaProcessor:
                 'visual_cues': ['horizontal_list', 'arrow_indicators', 'menu_items']
             }
         }
+        
+        # Flattened, pre-lowered keyword table (pattern order preserved for first-match wins)
+        self._flat_keywords = [
+            (keyword.lower(), element_type)
+            for element_type, pattern_data in self.ui_patterns.items()
+            for keyword in pattern_data['keywords']
+        ]
+        self._email_re = re.compile(r'@|email')
+        self._button_verb_re = re.compile(r'click|tap|press')
     
     def capture_figma_screenshots(self, file_key: str, node_ids: List[str] = None, 
                                 scale: float = 2.0, format: str = 'png') -> Dict[str, str]:
@@ -98,7 +242,7 @@ class EnhancedFigmaProcessor:
         try:
             # First, validate that the file exists and is accessible
             file_url = f"{self.base_url}/files/{file_key}"
-            file_response = requests.get(file_url, headers=self.headers, timeout=30)
+            file_response = self._session.get(file_url, headers=self.headers, timeout=30)
             
             if file_response.status_code == 404:
                 raise Exception(f"Figma file not found: {file_key}. Check if the file ID is correct and accessible.")
@@ -132,7 +276,7 @@ class EnhancedFigmaProcessor:
                     raise Exception("No canvas nodes found in the file for screenshot capture")
             
             print(f"🎨 Requesting Figma screenshots: {url}")
-            response = requests.get(url, headers=self.headers, params=params, timeout=30)
+            response = self._session.get(url, headers=self.headers, params=params, timeout=30)
             
             if response.status_code == 400:
                 error_detail = response.json() if response.headers.get('content-type') == 'application/json' else response.text
@@ -175,7 +319,7 @@ class EnhancedFigmaProcessor:
         """
         try:
             url = f"{self.base_url}/files/{file_key}"
-            response = requests.get(url, headers=self.headers, timeout=30)
+            response = self._session.get(url, headers=self.headers, timeout=30)
             response.raise_for_status()
             
             data = response.json()
@@ -193,6 +337,58 @@ class EnhancedFigmaProcessor:
             print(f"❌ Error getting canvas nodes: {e}")
             return []
     
+    def _get_file_last_modified(self, file_key: str) -> Optional[str]:
+        """Fetch the file's lastModified timestamp with a shallow (depth=1) request"""
+        try:
+            url = f"{self.base_url}/files/{file_key}"
+            response = self._session.get(url, headers=self.headers, params={'depth': 1}, timeout=30)
+            response.raise_for_status()
+            return response.json().get('lastModified')
+        except Exception as e:
+            print(f"⚠️ Could not read lastModified for {file_key}: {e}")
+            return None
+    
+    def _refresh_screenshot_url(self, file_key: str, rendered_node_id: str) -> str:
+        """Fresh render URL for a node (Figma image URLs are signed and expire); '' on failure"""
+        try:
+            url = f"{self.base_url}/images/{file_key}"
+            params = {'ids': rendered_node_id, 'format': 'png', 'scale': '2.0'}
+            response = self._session.get(url, headers=self.headers, params=params, timeout=30)
+            response.raise_for_status()
+            return (response.json().get('images') or {}).get(rendered_node_id) or ''
+        except Exception as e:
+            print(f"⚠️ Could not refresh screenshot URL for {file_key}: {e}")
+            return ''
+    
+    def _analysis_cache_path(self, file_key: str, node_id: Optional[str], last_modified: str) -> str:
+        """Path of the cached analysis for this file/node/version"""
+        # v2: entries are (rendered node id, analysis without its expiring screenshot URL)
+        key = hashlib.sha1(f"v2|{file_key}|{node_id}|{last_modified}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+    
+    def _load_cached_analysis(self, cache_path: str) -> Optional[Tuple[str, 'FigmaImageAnalysis']]:
+        """Load a cached (rendered node id, analysis) entry, ignoring missing or unreadable ones"""
+        try:
+            with open(cache_path, 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable analysis cache {cache_path}: {e}")
+            return None
+    
+    def _save_cached_analysis(self, cache_path: str, rendered_node_id: str, analysis: 'FigmaImageAnalysis') -> None:
+        """Atomically write an analysis to the disk cache, without its expiring screenshot URL"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            entry = (rendered_node_id, dataclasses.replace(analysis, screenshot_url=''))
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            print(f"⚠️ Could not write analysis cache: {e}")
+    
     def download_and_preprocess_image(self, image_url: str) -> Optional[np.ndarray]:
         """
         Download Figma image and preprocess for analysis
@@ -201,62 +397,90 @@ class EnhancedFigmaProcessor:
             image_url: URL of the Figma screenshot
             
         Returns:
-            Preprocessed image as numpy array
+            Preprocessed BGR image as numpy array
         """
+        with _image_memo_lock:
+            if image_url in _image_memo:
+                _image_memo.move_to_end(image_url)
+                return _image_memo[image_url]
+        
         try:
             # Download image
-            response = requests.get(image_url, timeout=30)
+            response = self._session.get(image_url, timeout=30)
             response.raise_for_status()
             
-            # Convert to PIL Image
-            image_data = io.BytesIO(response.content)
-            pil_image = Image.open(image_data)
+            # Decode straight from the response bytes into a BGR array
+            buffer = np.frombuffer(response.content, dtype=np.uint8)
+            image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
             
-            # Convert to RGB if necessary
-            if pil_image.mode != 'RGB':
-                pil_image = pil_image.convert('RGB')
+            # Fall back to PIL for formats OpenCV cannot decode
+            if image is None:
+                pil_image = Image.open(io.BytesIO(response.content)).convert('RGB')
+                image = cv2.cvtColor(np.asarray(pil_image), cv2.COLOR_RGB2BGR)
             
             # Enhance image for better OCR
-            enhancer = ImageEnhance.Contrast(pil_image)
-            pil_image = enhancer.enhance(1.2)
-            
-            enhancer = ImageEnhance.Sharpness(pil_image)
-            pil_image = enhancer.enhance(1.1)
+            image = self._enhance_for_ocr(image)
             
-            # Convert to numpy array for OpenCV processing
-            cv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+            with _image_memo_lock:
+                _image_memo[image_url] = image
+                if len(_image_memo) > _IMAGE_MEMO_SIZE:
+                    _image_memo.popitem(last=False)
             
-            return cv_image
+            return image
             
         except Exception as e:
             print(f"❌ Error downloading/preprocessing image: {e}")
             return None
     
+    def _enhance_for_ocr(self, image: np.ndarray) -> np.ndarray:
+        """Boost contrast (1.2x) and sharpness (1.1x) like PIL's ImageEnhance, in OpenCV"""
+        # Contrast pivots on mean luminance, computed from per-channel means
+        mean_b, mean_g, mean_r, _ = cv2.mean(image)
+        mean = int(0.299 * mean_r + 0.587 * mean_g + 0.114 * mean_b + 0.5)
+        image = cv2.addWeighted(image, 1.2, image, 0.0, -0.2 * mean)
+        
+        # Sharpness blends away from PIL's SMOOTH-filtered image
+        smooth = cv2.filter2D(image, -1, SMOOTH_KERNEL)
+        return cv2.addWeighted(image, 1.1, smooth, -0.1, 0)
+    
     def extract_text_with_context(self, image: np.ndarray) -> Dict[str, Any]:
         """
         Extract text from image with positional context
         
         Args:
-            image: Preprocessed image as numpy array
+            image: Grayscale (or BGR) image as numpy array
             
         Returns:
             Dictionary with extracted text and positional data
         """
         try:
-            # Convert back to PIL for Tesseract
-            pil_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+            # Tesseract works on grayscale internally, so feed it directly
+            if image.ndim == 3:
+                image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            
+            # Wrap the (C-contiguous) ndarray buffer instead of copying it into PIL
+            image = np.ascontiguousarray(image)
+            height, width = image.shape
+            pil_image = Image.frombuffer('L', (width, height), image, 'raw', 'L', 0, 1)
             
             # Try detailed OCR first, fallback to simple if it fails
             try:
-                ocr_data = pytesseract.image_to_data(
-                    pil_image, 
-                    config=self.ocr_config,
-                    output_type=pytesseract.Output.DICT
-                )
+                ocr_data = self._tesserocr_image_to_data(pil_image)
+                if ocr_data is None:  # tesserocr not installed or unusable
+                    ocr_data = pytesseract.image_to_data(
+                        pil_image, 
+                        config=self.ocr_config,
+                        output_type=pytesseract.Output.DICT
+                    )
             except Exception as ocr_error:
                 print(f"⚠️ Detailed OCR failed ({ocr_error}), trying simple OCR...")
                 # Fallback to simple text extraction
-                simple_text = pytesseract.image_to_string(pil_image)
+                with tess_api(psm='SINGLE_BLOCK', oem='LSTM_ONLY') as api:
+                    if api is not None:
+                        api.SetImage(pil_image)
+                        simple_text = api.GetUTF8Text()
+                if api is None:
+                    simple_text = pytesseract.image_to_string(pil_image)
                 return {
                     'full_text': simple_text.strip(),
                     'text_elements': [],
@@ -264,28 +488,38 @@ class EnhancedFigmaProcessor:
                     'average_confidence': 50  # Default confidence for simple OCR
                 }
             
-            # Extract text with coordinates
-            text_elements = []
-            full_text = []
-            
-            for i in range(len(ocr_data['text'])):
-                text = ocr_data['text'][i].strip()
-                if text and int(ocr_data['conf'][i]) > 30:  # Confidence threshold
-                    text_elements.append({
-                        'text': text,
-                        'x': ocr_data['left'][i],
-                        'y': ocr_data['top'][i],
-                        'width': ocr_data['width'][i],
-                        'height': ocr_data['height'][i],
-                        'confidence': int(ocr_data['conf'][i])
-                    })
-                    full_text.append(text)
+            # Filter OCR rows with a single NumPy mask (non-empty text, confidence > 30)
+            texts = np.char.strip(np.array(ocr_data['text'], dtype=str))
+            confidences = np.asarray(ocr_data['conf'], dtype=np.float64).astype(np.int64)
+            mask = (np.char.str_len(texts) > 0) & (confidences > 30)
+            
+            filtered_texts = texts[mask]
+            filtered_conf = confidences[mask]
+            
+            text_elements = [
+                {
+                    'text': text,
+                    'x': x,
+                    'y': y,
+                    'width': width,
+                    'height': height,
+                    'confidence': confidence
+                }
+                for text, x, y, width, height, confidence in zip(
+                    filtered_texts.tolist(),
+                    np.asarray(ocr_data['left'])[mask].tolist(),
+                    np.asarray(ocr_data['top'])[mask].tolist(),
+                    np.asarray(ocr_data['width'])[mask].tolist(),
+                    np.asarray(ocr_data['height'])[mask].tolist(),
+                    filtered_conf.tolist()
+                )
+            ]
             
             return {
-                'full_text': ' '.join(full_text),
+                'full_text': ' '.join(filtered_texts.tolist()),
                 'text_elements': text_elements,
-                'total_words': len([t for t in text_elements if len(t['text']) > 1]),
-                'average_confidence': np.mean([t['confidence'] for t in text_elements]) if text_elements else 0
+                'total_words': int((np.char.str_len(filtered_texts) > 1).sum()),
+                'average_confidence': float(filtered_conf.mean()) if filtered_conf.size else 0
             }
             
         except Exception as e:
@@ -297,12 +531,51 @@ class EnhancedFigmaProcessor:
                 'average_confidence': 0
             }
     
+    def _tesserocr_image_to_data(self, pil_image: Image.Image) -> Optional[Dict[str, List[Any]]]:
+        """
+        Run word-level OCR through a persistent tesserocr engine
+        
+        Args:
+            pil_image: Image to recognize
+            
+        Returns:
+            Dictionary shaped like pytesseract's image_to_data DICT output, or None when
+            tesserocr is unavailable
+        """
+        ocr_data = {'text': [], 'left': [], 'top': [], 'width': [], 'height': [], 'conf': []}
+        
+        with tess_api(psm='SINGLE_BLOCK', oem='LSTM_ONLY') as api:
+            if api is None:
+                return None
+            from tesserocr import RIL, iterate_level
+            
+            api.SetImage(pil_image)
+            api.Recognize()
+            iterator = api.GetIterator()
+            if iterator is None:
+                return ocr_data
+            
+            for word in iterate_level(iterator, RIL.WORD):
+                text = word.GetUTF8Text(RIL.WORD)
+                box = word.BoundingBox(RIL.WORD)
+                if text is None or box is None:
+                    continue
+                x1, y1, x2, y2 = box
+                ocr_data['text'].append(text)
+                ocr_data['left'].append(x1)
+                ocr_data['top'].append(y1)
+                ocr_data['width'].append(x2 - x1)
+                ocr_data['height'].append(y2 - y1)
+                ocr_data['conf'].append(word.Confidence(RIL.WORD))
+        
+        return ocr_data
+    
     def detect_ui_elements(self, image: np.ndarray, text_data: Dict[str, Any]) -> List[VisualElement]:
         """
         Detect UI elements using computer vision and text analysis
         
         Args:
-            image: Preprocessed image
+            image: Grayscale (or BGR) image
             text_data: OCR text data with positions
             
         Returns:
@@ -311,12 +584,15 @@ class EnhancedFigmaProcessor:
         visual_elements = []
         
         try:
-            # Convert to grayscale for contour detection
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            # Contour detection needs grayscale; accept a BGR frame for direct callers
+            gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
             
-            # Find rectangles (potential buttons, input fields)
-            edges = cv2.Canny(gray, 50, 150)
-            contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            # Find rectangles (potential buttons, input fields). Flat UI screenshots have
+            # hard-edged color regions, so a local threshold + close gives clean outlines
+            binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C,
+                                           cv2.THRESH_BINARY_INV, 25, 10)
+            closed = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, MORPH_KERNEL)
+            contours, _ = cv2.findContours(closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
             
             # Analyze text elements for UI patterns
             for text_element in text_data['text_elements']:
@@ -339,28 +615,33 @@ class EnhancedFigmaProcessor:
                         }
                     ))
             
-            # Analyze geometric shapes for UI elements
-            for contour in contours:
-                area = cv2.contourArea(contour)
-                if 100 < area < 50000:  # Filter reasonable sizes
-                    x, y, w, h = cv2.boundingRect(contour)
-                    
-                    # Classify based on shape characteristics
-                    aspect_ratio = w / h if h > 0 else 0
-                    element_type = self._classify_geometric_element(aspect_ratio, area)
-                    
-                    if element_type:
-                        visual_elements.append(VisualElement(
-                            element_type=element_type,
-                            text_content='',
-                            coordinates=(x, y, w, h),
-                            confidence=0.7,  # Medium confidence for geometric detection
-                            properties={
-                                'detection_method': 'geometric_analysis',
-                                'aspect_ratio': aspect_ratio,
-                                'area': area
-                            }
-                        ))
+            # Analyze geometric shapes for UI elements (classified in one batch)
+            areas = np.fromiter((cv2.contourArea(c) for c in contours),
+                                dtype=np.float64, count=len(contours))
+            keep = np.flatnonzero((areas > 100) & (areas < 50000))  # Filter reasonable sizes
+            
+            if keep.size:
+                areas = areas[keep]
+                rects = np.array([cv2.boundingRect(contours[i]) for i in keep], dtype=np.int64)
+                widths = rects[:, 2].astype(np.float64)
+                heights = rects[:, 3].astype(np.float64)
+                aspect_ratios = np.divide(widths, heights, out=np.zeros_like(widths), where=heights > 0)
+                
+                codes = classify_geo(aspect_ratios, areas)
+                
+                for i in np.flatnonzero(codes):
+                    x, y, w, h = (int(v) for v in rects[i])
+                    visual_elements.append(VisualElement(
+                        element_type=GEOMETRIC_ELEMENT_TYPES[codes[i]],
+                        text_content='',
+                        coordinates=(x, y, w, h),
+                        confidence=0.7,  # Medium confidence for geometric detection
+                        properties={
+                            'detection_method': 'geometric_analysis',
+                            'aspect_ratio': float(aspect_ratios[i]),
+                            'area': float(areas[i])
+                        }
+                    ))
             
             print(f"✅ Detected {len(visual_elements)} UI elements")
             return visual_elements
@@ -373,32 +654,20 @@ class EnhancedFigmaProcessor:
         """Classify text element based on content"""
         text_lower = text.lower()
         
-        for element_type, pattern_data in self.ui_patterns.items():
-            for keyword in pattern_data['keywords']:
-                if keyword in text_lower:
-                    return element_type
+        for keyword, element_type in self._flat_keywords:
+            if keyword in text_lower:
+                return element_type
         
         # Additional heuristics
         if len(text) < 3 and text.isalnum():
             return 'label'
-        elif '@' in text or 'email' in text_lower:
+        elif self._email_re.search(text_lower):
             return 'input_field'
-        elif any(word in text_lower for word in ['click', 'tap', 'press']):
+        elif self._button_verb_re.search(text_lower):
             return 'button'
         
         return None
     
-    def _classify_geometric_element(self, aspect_ratio: float, area: float) -> Optional[str]:
-        """Classify element based on geometric properties"""
-        if 2 < aspect_ratio < 8 and 500 < area < 5000:
-            return 'button'
-        elif 3 < aspect_ratio < 10 and 300 < area < 3000:
-            return 'input_field'
-        elif 0.8 < aspect_ratio < 1.2 and 100 < area < 1000:
-            return 'checkbox'
-        
-        return None
-    
     def analyze_figma_image(self, file_key: str, node_id: str = None) -> Optional[FigmaImageAnalysis]:
         """
         Comprehensive analysis of Figma image for test case generation
@@ -413,6 +682,18 @@ class EnhancedFigmaProcessor:
         try:
             print(f"🎨 Starting Figma image analysis for file: {file_key}")
             
+            # Reuse a previous analysis if the file hasn't changed since
+            cache_path = None
+            last_modified = self._get_file_last_modified(file_key)
+            if last_modified:
+                cache_path = self._analysis_cache_path(file_key, node_id, last_modified)
+                cached = self._load_cached_analysis(cache_path)
+                if cached is not None:
+                    print(f"♻️ Using cached image analysis (lastModified {last_modified})")
+                    rendered_node_id, analysis = cached
+                    analysis.screenshot_url = self._refresh_screenshot_url(file_key, rendered_node_id)
+                    return analysis
+            
             # Capture screenshots
             node_ids = [node_id] if node_id else None
             image_urls = self.capture_figma_screenshots(file_key, node_ids)
@@ -421,18 +702,21 @@ class EnhancedFigmaProcessor:
                 return None
             
             # Process the first available image
-            screenshot_url = list(image_urls.values())[0]
+            rendered_node_id, screenshot_url = next(iter(image_urls.items()))
             
             # Download and preprocess
             image = self.download_and_preprocess_image(screenshot_url)
             if image is None:
                 return None
             
+            # Single color conversion shared by OCR and contour detection
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            
             # Extract text with context
-            text_data = self.extract_text_with_context(image)
+            text_data = self.extract_text_with_context(gray)
             
             # Detect UI elements
-            visual_elements = self.detect_ui_elements(image, text_data)
+            visual_elements = self.detect_ui_elements(gray, text_data)
             
             # Identify UI patterns
             ui_patterns = self._identify_ui_patterns(visual_elements, text_data)
@@ -457,6 +741,9 @@ class EnhancedFigmaProcessor:
             print(f"✅ Image analysis complete: {len(visual_elements)} elements, "
                   f"quality: {quality_score:.2f}")
             
+            if cache_path:
+                self._save_cached_analysis(cache_path, rendered_node_id, analysis)
+            
             return analysis
             
         except Exception as e:
@@ -467,23 +754,23 @@ class EnhancedFigmaProcessor:
                             text_data: Dict[str, Any]) -> List[str]:
         """Identify UI patterns from visual elements"""
         patterns = []
-        element_types = [elem.element_type for elem in visual_elements]
+        types = visual_elements_to_soa(visual_elements, fields=('types',))['types']
+        input_count = int((types == 'input_field').sum())
         
         # Form patterns
-        if 'input_field' in element_types and 'button' in element_types:
+        if input_count and (types == 'button').any():
             patterns.append('form_submission')
         
         # Navigation patterns
-        if len([e for e in visual_elements if e.element_type == 'navigation']) > 2:
+        if (types == 'navigation').sum() > 2:
             patterns.append('multi_step_navigation')
         
         # Data entry patterns
-        input_count = len([e for e in visual_elements if e.element_type == 'input_field'])
         if input_count > 3:
             patterns.append('complex_form')
         
         # Choice patterns
-        if 'checkbox' in element_types or 'dropdown' in element_types:
+        if ((types == 'checkbox') | (types == 'dropdown')).any():
             patterns.append('user_choice')
         
         return patterns
@@ -496,18 +783,11 @@ class EnhancedFigmaProcessor:
         
         # Element-specific recommendations
         for element in visual_elements:
-            if element.element_type == 'button':
-                recommendations.append(f"Test {element.text_content or 'button'} click functionality")
-                recommendations.append(f"Verify {element.text_content or 'button'} hover states")
-            
-            elif element.element_type == 'input_field':
-                recommendations.append(f"Test {element.text_content or 'input field'} with valid data")
-                recommendations.append(f"Test {element.text_content or 'input field'} with invalid data")
-                recommendations.append(f"Verify {element.text_content or 'input field'} validation messages")
-            
-            elif element.element_type == 'dropdown':
-                recommendations.append(f"Test {element.text_content or 'dropdown'} option selection")
-                recommendations.append(f"Verify {element.text_content or 'dropdown'} keyboard navigation")
+            template_entry = self._RECOMMENDATION_TEMPLATES.get(element.element_type)
+            if template_entry:
+                label, templates = template_entry
+                t = element.text_content or label
+                recommendations.extend(template.format(t=t) for template in templates)
         
         # Pattern-specific recommendations
         for pattern in ui_patterns:
@@ -563,18 +843,19 @@ class EnhancedFigmaProcessor:
 **Detected UI Elements ({len(analysis.visual_elements)}):**
 """
         
-        # Group elements by type
-        element_groups = {}
+        # Group elements by type in one pass, keeping only non-empty names
+        element_counts = defaultdict(int)
+        element_names = defaultdict(list)
         for element in analysis.visual_elements:
-            if element.element_type not in element_groups:
-                element_groups[element.element_type] = []
-            element_groups[element.element_type].append(element)
+            element_counts[element.element_type] += 1
+            if element.text_content:
+                element_names[element.element_type].append(element.text_content)
         
-        for element_type, elements in element_groups.items():
-            names = [e.text_content for e in elements if e.text_content]
-            context += f"- {element_type}: {len(elements)} found"
+        for element_type, count in element_counts.items():
+            names = element_names[element_type][:3]
+            context += f"- {element_type}: {count} found"
             if names:
-                context += f" ({', '.join(names[:3])})"
+                context += f" ({', '.join(names)})"
             context += "\n"
         
         context += f"\n**UI Patterns:** {', '.join(analysis.ui_patterns)}\n"
@@ -614,19 +895,11 @@ class EnhancedFigmaProcessor:
             }
             
             # Generate specific test scenarios for this element
-            if element.element_type == 'button':
-                element_data['test_scenarios'] = [
-                    f"Verify {element.text_content or 'button'} is clickable",
-                    f"Test {element.text_content or 'button'} visual feedback on hover",
-                    f"Validate {element.text_content or 'button'} action triggers correctly"
-                ]
-            
-            elif element.element_type == 'input_field':
-                element_data['test_scenarios'] = [
-                    f"Test {element.text_content or 'input'} accepts valid input",
-                    f"Test {element.text_content or 'input'} rejects invalid input",
-                    f"Verify {element.text_content or 'input'} placeholder text displays"
-                ]
+            template_entry = self._MAPPING_TEMPLATES.get(element.element_type)
+            if template_entry:
+                label, templates = template_entry
+                t = element.text_content or label
+                element_data['test_scenarios'] = [template.format(t=t) for template in templates]
             
             mapping['visual_elements'].append(element_data)
         
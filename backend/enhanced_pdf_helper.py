@@ -4,36 +4,286 @@ warnings.filterwarnings('ignore', category=UserWarning, module='pdfminer')
 warnings.filterwarnings('ignore', message='.*FontBBox.*')
 warnings.filterwarnings('ignore', message='.*DataFrame columns are not unique.*')
 
-import pdfplumber
-import pandas as pd
+import asyncio
+import importlib.util
 import logging
 import tempfile
 import os
-from typing import Dict, List, Optional, Union
+import json
+import hashlib
+from typing import Dict, List, Optional, Tuple, Union
 import re
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 
-# Suppress pandas warnings
-pd.options.mode.chained_assignment = None
+from tesseract_helper import tess_api
+
+# Heavy libraries (pdfplumber, pandas, fitz, PIL, OCR engines) are imported inside the
+# functions that use them; here we only check that they are installed.
+if importlib.util.find_spec('pdfplumber') is None or importlib.util.find_spec('pandas') is None:
+    raise ImportError("Enhanced PDF processing requires pdfplumber and pandas")
 
 # Optional dependencies - gracefully handle if not available
-try:
-    import fitz  # PyMuPDF
-    PYMUPDF_AVAILABLE = True
-except ImportError:
-    PYMUPDF_AVAILABLE = False
+PYMUPDF_AVAILABLE = importlib.util.find_spec('fitz') is not None
+if not PYMUPDF_AVAILABLE:
     print("⚠️ PyMuPDF not available - advanced PDF processing disabled")
 
-try:
-    import pytesseract
-    from PIL import Image
-    OCR_AVAILABLE = True
-except ImportError:
-    OCR_AVAILABLE = False
+# PDFium (C++) text extraction is several times faster than pdfminer-based pdfplumber
+PYPDFIUM2_AVAILABLE = importlib.util.find_spec('pypdfium2') is not None
+
+# Prefer in-process Tesseract (tesserocr); pytesseract spawns a process per call
+TESSEROCR_AVAILABLE = importlib.util.find_spec('tesserocr') is not None
+PYTESSERACT_AVAILABLE = importlib.util.find_spec('pytesseract') is not None
+OCR_AVAILABLE = importlib.util.find_spec('PIL') is not None and (TESSEROCR_AVAILABLE or PYTESSERACT_AVAILABLE)
+
+if not OCR_AVAILABLE:
     print("⚠️ Tesseract/PIL not available - OCR processing disabled")
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# (text, tables, looks_scanned) extracted from one pdfplumber page
+PageContent = Tuple[Optional[str], List[Dict], bool]
+
+# Pages with fewer characters than this are treated as scanned and left to OCR
+SCANNED_PAGE_MAX_CHARS = 20
+
+# pdfplumber table_settings presets, selectable per PDF class on EnhancedPDFProcessor.
+# 'lines' (ruled/lattice tables) matches pdfplumber's defaults; 'text' finds borderless tables.
+TABLE_SETTINGS_PRESETS = {
+    'lines': {'vertical_strategy': 'lines', 'horizontal_strategy': 'lines',
+              'snap_tolerance': 3, 'intersection_tolerance': 3},
+    'text': {'vertical_strategy': 'text', 'horizontal_strategy': 'text',
+             'snap_tolerance': 3, 'intersection_tolerance': 3},
+}
+
+# Page-level parallelism: small documents stay in-process to avoid worker startup cost
+MAX_PDF_WORKERS = min(os.cpu_count() or 1, 4)
+PARALLEL_PAGE_THRESHOLD = 2
+
+# Render scale for scanned-page OCR: 1.5x grayscale is ~1/5 of the pixel data of
+# 2x RGB; pages that come back empty or low-confidence are retried at 2x
+OCR_ZOOM = 1.5
+OCR_FALLBACK_ZOOM = 2.0
+OCR_MIN_CONFIDENCE = 60
+
+# Rendered pages / decoded images held in memory at once before they are OCR'd and released
+OCR_BATCH_SIZE = 8
+
+# Threads OCR'ing embedded-image batches while PyMuPDF keeps scanning pages; Tesseract
+# releases the GIL (tesserocr) or runs as a subprocess (pytesseract)
+IMAGE_OCR_WORKERS = os.cpu_count() or 1
+
+# Shared across extractions so its threads (and the tesserocr engines they use) live on
+_image_ocr_executor = None
+_image_ocr_executor_lock = threading.Lock()
+
+# Bump whenever extraction output changes so stale cache entries are ignored
+PDF_PROCESSOR_VERSION = '9'
+PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'testforge', 'pdf'))
+# Least recently used cache entries (by file mtime, refreshed on every hit) are evicted past either bound
+PDF_CACHE_MAX_ENTRIES = int(os.getenv('PDF_CACHE_MAX_ENTRIES', '256'))
+PDF_CACHE_MAX_BYTES = int(os.getenv('PDF_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+def _get_image_ocr_executor() -> ThreadPoolExecutor:
+    """Lazily create the process-wide embedded-image OCR thread pool"""
+    global _image_ocr_executor
+    with _image_ocr_executor_lock:
+        if _image_ocr_executor is None:
+            _image_ocr_executor = ThreadPoolExecutor(max_workers=IMAGE_OCR_WORKERS,
+                                                     thread_name_prefix='pdf-image-ocr')
+        return _image_ocr_executor
+
+
+def _uses_ruling_lines(table_settings: Dict) -> bool:
+    """True when both table edge strategies come from drawn lines/rects rather than text"""
+    return all(table_settings.get(key, 'lines') in ('lines', 'lines_strict')
+               for key in ('vertical_strategy', 'horizontal_strategy'))
+
+
+def _extract_page_content(page, page_num: int, include_text: bool = True,
+                          include_tables: bool = True,
+                          table_settings: Optional[Dict] = None) -> PageContent:
+    """Extract text and/or tables from a single pdfplumber page"""
+    import pandas as pd
+    
+    page_tables = []
+    
+    # Pages with (almost) no characters are scans: skip pdfminer layout analysis entirely
+    if include_text and len(page.chars) < SCANNED_PAGE_MAX_CHARS:
+        return None, page_tables, True
+    
+    # Extract text
+    page_text = page.extract_text() if include_text else None
+    
+    if not include_tables:
+        return page_text, page_tables, False
+    
+    # Ruled-table settings can't match a page without any drawn lines, rects or curves
+    table_settings = table_settings or TABLE_SETTINGS_PRESETS['lines']
+    if _uses_ruling_lines(table_settings) and not (page.lines or page.rects or page.curves):
+        return page_text, page_tables, False
+    
+    # Extract tables
+    tables = page.extract_tables(table_settings=table_settings)
+    for table_idx, table in enumerate(tables):
+        if table:
+            # Convert to DataFrame for better processing
+            try:
+                df = pd.DataFrame(table[1:], columns=table[0])  # First row as header
+                page_tables.append({
+                    'page': page_num,
+                    'table_index': table_idx,
+                    'content': df.to_dict('records'),
+                    'text_representation': (f"\n=== Table {table_idx+1} (Page {page_num}) ===\n"
+                                            f"{df.to_csv(sep='|', index=False)}\n")
+                })
+            except:
+                # Fallback: headerless representation (pandas writes None as '')
+                page_tables.append({
+                    'page': page_num,
+                    'table_index': table_idx,
+                    'content': table,
+                    'text_representation': (f"\n=== Table {table_idx+1} (Page {page_num}) ===\n"
+                                            f"{pd.DataFrame(table).to_csv(sep='|', index=False, header=False)}\n")
+                })
+    
+    return page_text, page_tables, False
+
+
+def _ocr_images(images: List['Image.Image'], lang: str) -> List[Tuple[str, int]]:
+    """
+    OCR several images, reusing one loaded Tesseract model
+    
+    With tesserocr the images go through a persistent engine. Otherwise (tesserocr
+    missing, or installed but failing to load) they are written as one multi-page
+    TIFF for a single pytesseract call; tesseract ends each page's text with a form
+    feed, used to split the output.
+    
+    Returns:
+        (text, mean confidence) per image; confidence is -1 when the engine
+        doesn't report it (pytesseract plain-text output)
+    """
+    if not images:
+        return []
+    
+    # Tesseract ignores alpha; normalize LA/RGBA to the modes both engines accept
+    frames = [img if img.mode in ('L', 'RGB') else img.convert('RGB') for img in images]
+    
+    with tess_api(lang=lang, psm='AUTO', oem='LSTM_ONLY') as api:
+        if api is not None:
+            results = []
+            for frame in frames:
+                api.SetImage(frame)
+                text = api.GetUTF8Text()
+                results.append((text, api.MeanTextConf()))
+            return results
+    
+    import pytesseract
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        batch_path = os.path.join(tmp_dir, 'batch.tiff')
+        frames[0].save(batch_path, save_all=True, append_images=frames[1:], compression='tiff_deflate')
+        text = pytesseract.image_to_string(batch_path, lang=lang)
+    
+    page_texts = text.split('\x0c')
+    return [(page_texts[i] if i < len(page_texts) else '', -1) for i in range(len(images))]
+
+
+def _is_low_confidence(text: str, confidence: int) -> bool:
+    """True when an OCR result is worth retrying at a higher resolution"""
+    return not text.strip() or 0 <= confidence < OCR_MIN_CONFIDENCE
+
+
+# Whitespace cleanup applied in _post_process_content
+_RE_BLANK_LINES = re.compile(r'\n\s*\n\s*\n')
+# Zero-width split point before every '---' / '===' marker line
+_RE_SECTION_BREAK = re.compile(r'(?m)^(?=[^\S\n]*(?:---|===))')
+
+# PIL mode for a pixmap's (color channels, alpha) layout
+_PIXMAP_MODES = {(1, 0): 'L', (1, 1): 'LA', (3, 0): 'RGB', (3, 1): 'RGBA'}
+
+
+def _pixmap_to_pil(pix) -> 'Image.Image':
+    """Wrap a PyMuPDF pixmap's raw samples as a PIL image (no PPM encode/decode)"""
+    from PIL import Image
+    
+    mode = _PIXMAP_MODES[(pix.n - pix.alpha, pix.alpha)]
+    return Image.frombuffer(mode, (pix.width, pix.height), pix.samples, 'raw', mode, pix.stride, 1)
+
+
+def _info_dict_from_fitz_metadata(metadata: Optional[Dict]) -> Dict:
+    """Map PyMuPDF metadata ('creationDate') to PDF Info keys ('CreationDate') as pdfplumber reports them"""
+    return {
+        key[0].upper() + key[1:]: value
+        for key, value in (metadata or {}).items()
+        if value and key not in ('format', 'encryption')
+    }
+
+
+def _limit_ocr_threads():
+    """Pool initializer: one tesseract thread per worker so parallel pages don't oversubscribe cores"""
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+
+
+def _render_pages(doc, page_nums: List[int], zoom: float) -> List['Image.Image']:
+    """Render pages straight to grayscale; Tesseract only uses luminance"""
+    import fitz
+    
+    page_images = []
+    for page_num in page_nums:
+        pix = doc[page_num].get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY)
+        page_images.append(_pixmap_to_pil(pix))
+        pix = None  # Free memory
+    return page_images
+
+
+def _ocr_rendered_pages(doc, page_nums: List[int], zoom: float, lang: str) -> List[Tuple[str, int]]:
+    """Render and OCR pages OCR_BATCH_SIZE at a time so only one batch of bitmaps is alive"""
+    results = []
+    for start in range(0, len(page_nums), OCR_BATCH_SIZE):
+        page_images = _render_pages(doc, page_nums[start:start + OCR_BATCH_SIZE], zoom)
+        results.extend(_ocr_images(page_images, lang))
+        del page_images
+    return results
+
+
+def _ocr_document_pages(doc, page_nums: List[int], zoom: float, lang: str) -> List[str]:
+    """Render the given (0-based) pages of an open document and OCR them in batches"""
+    results = _ocr_rendered_pages(doc, page_nums, zoom, lang)
+    
+    # Retry weak pages once at the higher fallback resolution
+    retry = [i for i, (text, confidence) in enumerate(results) if _is_low_confidence(text, confidence)]
+    if retry and zoom < OCR_FALLBACK_ZOOM:
+        retried = _ocr_rendered_pages(doc, [page_nums[i] for i in retry], OCR_FALLBACK_ZOOM, lang)
+        for i, retried_result in zip(retry, retried):
+            results[i] = retried_result
+    
+    return [text for text, _ in results]
+
+
+def _ocr_page_range(pdf_path: str, page_nums: List[int], zoom: float, lang: str) -> List[str]:
+    """Worker entry point: documents aren't picklable, so open by path and OCR the given pages"""
+    import fitz
+    
+    doc = fitz.open(pdf_path)
+    try:
+        return _ocr_document_pages(doc, page_nums, zoom, lang)
+    finally:
+        doc.close()
+
+
+def _process_page(pdf_path: str, page_spec: Tuple[int, bool, bool],
+                  table_settings: Optional[Dict] = None) -> PageContent:
+    """Worker entry point: pdfplumber pages aren't picklable, so re-open just this page"""
+    import pdfplumber
+    
+    page_num, include_text, include_tables = page_spec
+    with pdfplumber.open(pdf_path, pages=[page_num]) as pdf:
+        return _extract_page_content(pdf.pages[0], page_num, include_text, include_tables, table_settings)
+
 class EnhancedPDFProcessor:
     """
     🚀 Enhanced PDF processing with multiple extraction methods
@@ -44,9 +294,76 @@ class EnhancedPDFProcessor:
     - Structured content organization
     """
     
-    def __init__(self):
+    def __init__(self, table_settings: Union[str, Dict] = 'lines'):
+        """
+        Args:
+            table_settings: pdfplumber table_settings dict, or a TABLE_SETTINGS_PRESETS name
+                ('lines' for ruled tables, 'text' for borderless ones)
+        """
         self.supported_formats = ['.pdf']
         self.ocr_languages = 'eng'  # Add hindi: 'eng+hin'
+        self.cache_dir = PDF_CACHE_DIR
+        if isinstance(table_settings, str):
+            table_settings = TABLE_SETTINGS_PRESETS[table_settings]
+        self.table_settings = dict(table_settings)
+        
+    def _cache_key(self, pdf_path: str) -> str:
+        """SHA-256 of the file contents plus everything that affects the output"""
+        table_settings = json.dumps(self.table_settings, sort_keys=True, default=str)
+        digest = hashlib.sha256(f"{PDF_PROCESSOR_VERSION}|{self.ocr_languages}|{table_settings}|".encode())
+        with open(pdf_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def _load_cached_result(self, cache_key: str) -> Optional[Dict]:
+        """Return a cached extraction result, or None on miss/corruption"""
+        cache_path = os.path.join(self.cache_dir, f"{cache_key}.json")
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            os.utime(cache_path)  # Mark as recently used for LRU eviction
+            return cached
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable PDF cache entry {cache_path}: {e}")
+            return None
+    
+    def _save_cached_result(self, cache_key: str, result: Dict) -> None:
+        """Atomically write an extraction result so concurrent workers never see partial files"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            cache_path = os.path.join(self.cache_dir, f"{cache_key}.json")
+            tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f, default=str)
+            os.replace(tmp_path, cache_path)
+            self._evict_cache_entries()
+        except Exception as e:
+            logger.warning(f"Could not write PDF cache entry: {e}")
+    
+    def _evict_cache_entries(self) -> None:
+        """Delete least recently used cache entries beyond PDF_CACHE_MAX_ENTRIES / PDF_CACHE_MAX_BYTES"""
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith('.json'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue  # Evicted concurrently
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        
+        entries.sort(reverse=True)  # Most recently used first
+        total_bytes = 0
+        for kept, (_, size, path) in enumerate(entries):
+            total_bytes += size
+            if kept >= PDF_CACHE_MAX_ENTRIES or total_bytes > PDF_CACHE_MAX_BYTES:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
         
     def extract_comprehensive_content(self, pdf_path: str) -> Dict[str, Union[str, List, Dict]]:
         """
@@ -63,24 +380,61 @@ class EnhancedPDFProcessor:
             'quality_score': 0.0
         }
         
+        doc = None  # PyMuPDF document, opened once and shared by the PyMuPDF and OCR passes
         try:
-            # Method 1: PDFPlumber (best for text + tables)
-            plumber_result = self._extract_with_pdfplumber(pdf_path)
+            # Identical files (e.g. re-uploads on retry) skip the whole pipeline
+            cache_key = self._cache_key(pdf_path)
+            cached = self._load_cached_result(cache_key)
+            if cached is not None:
+                logger.info("♻️ Using cached PDF extraction result")
+                return cached
             
-            # Method 2: PyMuPDF (best for complex layouts + images) - Optional
+            # Method 1: PyMuPDF (fast text + images, flags pages that contain tables) - Optional
             if PYMUPDF_AVAILABLE:
                 try:
-                    pymupdf_result = self._extract_with_pymupdf(pdf_path)
+                    import fitz
+                    
+                    doc = fitz.open(pdf_path)
+                    pymupdf_result = self._extract_with_pymupdf(doc)
                 except Exception as e:
                     logger.warning(f"PyMuPDF extraction failed: {e}")
-                    pymupdf_result = {'text_content': '', 'images_text': [], 'method': 'pymupdf_failed'}
+                    pymupdf_result = {'text_content': '', 'images_text': [], 'table_pages': None, 'method': 'pymupdf_failed'}
+            else:
+                pymupdf_result = {'text_content': '', 'images_text': [], 'table_pages': None, 'method': 'pymupdf_unavailable'}
+            
+            # Method 2: pdfium2 (fast C++ text) when PyMuPDF's text is insufficient - Optional
+            need_text = len(pymupdf_result['text_content']) <= 100
+            if need_text and PYPDFIUM2_AVAILABLE:
+                pdfium_result = self._extract_with_pdfium2(pdf_path)
+            else:
+                pdfium_result = {'text_content': '', 'method': 'pdfium2_skipped'}
+            
+            # Method 3: PDFPlumber (best for tables) - text only when no faster engine produced it,
+            # tables only on pages PyMuPDF flagged (every page if it couldn't tell)
+            need_plumber_text = need_text and pdfium_result['method'] != 'pdfium2'
+            table_pages = pymupdf_result.get('table_pages')
+            if need_plumber_text or table_pages is None or table_pages:
+                plumber_result = self._extract_with_pdfplumber(
+                    pdf_path,
+                    include_text=need_plumber_text,
+                    table_pages=table_pages
+                )
             else:
-                pymupdf_result = {'text_content': '', 'images_text': [], 'method': 'pymupdf_unavailable'}
+                # Good text and no tables: pdfplumber has nothing to add
+                plumber_result = {
+                    'text_content': '',
+                    'tables': [],
+                    'metadata': pymupdf_result.get('metadata', {}),
+                    'method': 'pdfplumber_skipped'
+                }
             
-            # Method 3: OCR fallback for scanned PDFs - Optional
-            if OCR_AVAILABLE:
+            # Method 4: OCR fallback for scanned PDFs - Optional (renders pages via PyMuPDF)
+            if OCR_AVAILABLE and doc is not None:
                 try:
-                    ocr_result = self._extract_with_ocr_if_needed(pdf_path, plumber_result['text_content'])
+                    existing_text = max(plumber_result['text_content'], pdfium_result['text_content'],
+                                        pymupdf_result['text_content'], key=len)
+                    scanned_pages = plumber_result.get('scanned_pages', pdfium_result.get('scanned_pages'))
+                    ocr_result = self._extract_with_ocr_if_needed(doc, existing_text, scanned_pages)
                 except Exception as e:
                     logger.warning(f"OCR processing failed: {e}")
                     ocr_result = {'text_content': '', 'method': 'ocr_failed', 'was_needed': False}
@@ -88,7 +442,7 @@ class EnhancedPDFProcessor:
                 ocr_result = {'text_content': '', 'method': 'ocr_unavailable', 'was_needed': False}
             
             # Combine results intelligently
-            result = self._combine_extraction_results(plumber_result, pymupdf_result, ocr_result)
+            result = self._combine_extraction_results(plumber_result, pymupdf_result, ocr_result, pdfium_result)
             
             # Post-process and structure content
             result = self._post_process_content(result)
@@ -96,14 +450,33 @@ class EnhancedPDFProcessor:
             logger.info(f"✅ PDF processing complete: {len(result['text_content'])} chars, "
                        f"{len(result['tables'])} tables, {len(result['images_text'])} images")
             
+            # Only complete extractions are cached; a failed method would be replayed on every hit
+            failed_methods = [r['method'] for r in (pymupdf_result, pdfium_result, plumber_result, ocr_result)
+                              if r['method'].endswith('_failed') or r.get('ocr_errors')]
+            if failed_methods:
+                logger.info(f"Not caching PDF extraction result ({', '.join(failed_methods)} had errors)")
+            else:
+                self._save_cached_result(cache_key, result)
+            
         except Exception as e:
             logger.error(f"❌ PDF processing failed: {e}")
             result['text_content'] = f"Error processing PDF: {str(e)}"
+        finally:
+            if doc is not None:
+                doc.close()
             
         return result
     
-    def _extract_with_pdfplumber(self, pdf_path: str) -> Dict:
-        """Extract using pdfplumber (excellent for tables and clean text)"""
+    def _extract_with_pdfplumber(self, pdf_path: str, include_text: bool = True,
+                                 table_pages: Optional[List[int]] = None) -> Dict:
+        """
+        Extract using pdfplumber (excellent for tables and clean text)
+        
+        Args:
+            pdf_path: Path to the PDF
+            include_text: Extract page text too (skipped when PyMuPDF text is already good)
+            table_pages: 1-based pages that may hold tables (None = check every page)
+        """
         result = {
             'text_content': '',
             'tables': [],
@@ -113,59 +486,106 @@ class EnhancedPDFProcessor:
         }
         
         try:
+            import pdfplumber
+            
             with pdfplumber.open(pdf_path) as pdf:
                 result['metadata'] = pdf.metadata or {}
                 result['page_count'] = len(pdf.pages)
+                if not include_text:
+                    result['method'] = 'pdfplumber_tables'
                 
-                all_text = []
-                all_tables = []
-                
-                for page_num, page in enumerate(pdf.pages, 1):
-                    # Extract text
-                    page_text = page.extract_text()
-                    if page_text:
-                        all_text.append(f"\n--- Page {page_num} ---\n{page_text}")
-                    
-                    # Extract tables
-                    tables = page.extract_tables()
-                    for table_idx, table in enumerate(tables):
-                        if table:
-                            # Convert to DataFrame for better processing
-                            try:
-                                df = pd.DataFrame(table[1:], columns=table[0])  # First row as header
-                                table_text = f"\n=== Table {table_idx+1} (Page {page_num}) ===\n{df.to_string()}\n"
-                                all_tables.append({
-                                    'page': page_num,
-                                    'table_index': table_idx,
-                                    'content': df.to_dict('records'),
-                                    'text_representation': table_text
-                                })
-                            except:
-                                # Fallback: simple text representation
-                                table_text = f"\n=== Table {table_idx+1} (Page {page_num}) ===\n"
-                                for row in table:
-                                    table_text += " | ".join(str(cell) for cell in row if cell) + "\n"
-                                all_tables.append({
-                                    'page': page_num,
-                                    'table_index': table_idx,
-                                    'content': table,
-                                    'text_representation': table_text
-                                })
+                # (page_num, include_text, include_tables) for every page with work to do
+                table_page_set = set(table_pages) if table_pages is not None else None
+                page_specs = [
+                    (page_num, include_text, table_page_set is None or page_num in table_page_set)
+                    for page_num in range(1, result['page_count'] + 1)
+                ]
+                page_specs = [spec for spec in page_specs if spec[1] or spec[2]]
                 
-                result['text_content'] = '\n'.join(all_text)
-                result['tables'] = all_tables
+                if len(page_specs) <= PARALLEL_PAGE_THRESHOLD:
+                    page_results = [_extract_page_content(pdf.pages[spec[0] - 1], *spec, self.table_settings)
+                                    for spec in page_specs]
+                else:
+                    page_results = self._extract_pages_in_parallel(pdf, pdf_path, page_specs)
+            
+            all_text = []
+            all_tables = []
+            scanned_pages = []
+            
+            for (page_num, _, _), (page_text, page_tables, is_scanned) in zip(page_specs, page_results):
+                if is_scanned:
+                    scanned_pages.append(page_num)
+                if page_text:
+                    all_text.append(f"\n--- Page {page_num} ---\n{page_text}")
+                all_tables.extend(page_tables)
+            
+            result['text_content'] = '\n'.join(all_text)
+            result['tables'] = all_tables
+            if include_text:
+                result['scanned_pages'] = scanned_pages
                 
         except Exception as e:
             logger.error(f"PDFPlumber extraction failed: {e}")
+            result['method'] = 'pdfplumber_failed'
+            
+        return result
+    
+    def _extract_with_pdfium2(self, pdf_path: str) -> Dict:
+        """Extract page text using pypdfium2 (PDFium), recording pages that look scanned"""
+        result = {
+            'text_content': '',
+            'scanned_pages': [],
+            'method': 'pdfium2'
+        }
+        
+        try:
+            import pypdfium2 as pdfium
+            
+            pdf = pdfium.PdfDocument(pdf_path)
+            try:
+                all_text = []
+                for page_index in range(len(pdf)):
+                    page = pdf[page_index]
+                    textpage = page.get_textpage()
+                    page_text = textpage.get_text_bounded().replace('\r\n', '\n')
+                    textpage.close()
+                    page.close()
+                    
+                    if len(page_text.strip()) < SCANNED_PAGE_MAX_CHARS:
+                        result['scanned_pages'].append(page_index + 1)
+                    if page_text.strip():
+                        all_text.append(f"\n--- Page {page_index + 1} ---\n{page_text}")
+            finally:
+                pdf.close()
+            
+            result['text_content'] = '\n'.join(all_text)
+            
+        except Exception as e:
+            logger.warning(f"pdfium2 extraction failed: {e}")
+            result['method'] = 'pdfium2_failed'
             
         return result
     
-    def _extract_with_pymupdf(self, pdf_path: str) -> Dict:
-        """Extract using PyMuPDF (excellent for images and complex layouts)"""
+    def _extract_pages_in_parallel(self, pdf, pdf_path: str,
+                                   page_specs: List[Tuple[int, bool, bool]]) -> List[PageContent]:
+        """Run pdfplumber page extraction across worker processes, preserving page order"""
+        try:
+            with ProcessPoolExecutor(max_workers=MAX_PDF_WORKERS) as executor:
+                worker = partial(_process_page, pdf_path, table_settings=self.table_settings)
+                return list(executor.map(worker, page_specs))
+        except Exception as e:
+            # Fall back to the already-open document in this process
+            logger.warning(f"Parallel page extraction failed ({e}), processing sequentially")
+            return [_extract_page_content(pdf.pages[spec[0] - 1], *spec, self.table_settings)
+                    for spec in page_specs]
+    
+    def _extract_with_pymupdf(self, doc) -> Dict:
+        """Extract using PyMuPDF (excellent for images and complex layouts) from an open document"""
         result = {
             'text_content': '',
             'images_text': [],
             'structured_sections': [],
+            'table_pages': None,
             'method': 'pymupdf'
         }
         
@@ -173,10 +593,22 @@ class EnhancedPDFProcessor:
             logger.warning("PyMuPDF not available")
             return result
         
+        executor = _get_image_ocr_executor()
+        ocr_futures = deque()  # In-flight image OCR batches, in page order
         try:
-            doc = fitz.open(pdf_path)
+            import fitz
+            
             all_text = []
             all_images_text = []
+            pending_images = []  # (page_num, img_index, PIL image) awaiting a batched OCR call
+            ocr_errors = 0  # Batches whose OCR raised
+            
+            # find_tables needs PyMuPDF 1.23+; without it pdfplumber checks every page. Its default
+            # (ruling-line) detection only mirrors the 'lines' presets: text-aligned tables have no
+            # ruling lines, so with a text strategy every page goes to pdfplumber.
+            can_find_tables = (doc.page_count > 0 and hasattr(doc[0], 'find_tables')
+                               and _uses_ruling_lines(self.table_settings))
+            table_pages = [] if can_find_tables else None
             
             for page_num in range(doc.page_count):
                 page = doc[page_num]
@@ -186,6 +618,15 @@ class EnhancedPDFProcessor:
                 if text.strip():
                     all_text.append(f"\n--- Page {page_num + 1} (PyMuPDF) ---\n{text}")
                 
+                # Flag pages with table candidates for pdfplumber
+                if can_find_tables:
+                    try:
+                        if page.find_tables().tables:
+                            table_pages.append(page_num + 1)
+                    except Exception as table_error:
+                        logger.warning(f"Table detection failed on page {page_num+1}: {table_error}")
+                        table_pages.append(page_num + 1)
+                
                 # Extract images and perform OCR
                 image_list = page.get_images()
                 for img_index, img in enumerate(image_list):
@@ -196,35 +637,85 @@ class EnhancedPDFProcessor:
                         
                         if pix.n - pix.alpha < 4:  # GRAY or RGB
                             # Convert to PIL Image
-                            img_data = pix.tobytes("ppm")
-                            pil_image = Image.open(fitz.io.BytesIO(img_data))
-                            
-                            # OCR on image
-                            ocr_text = pytesseract.image_to_string(pil_image, lang=self.ocr_languages)
-                            if ocr_text.strip():
-                                all_images_text.append({
-                                    'page': page_num + 1,
-                                    'image_index': img_index,
-                                    'ocr_text': ocr_text.strip(),
-                                    'formatted': f"\n=== Image {img_index+1} (Page {page_num+1}) OCR ===\n{ocr_text.strip()}\n"
-                                })
+                            pending_images.append((page_num, img_index, _pixmap_to_pil(pix)))
                         
                         pix = None  # Free memory
                         
                     except Exception as img_error:
                         logger.warning(f"Image extraction failed on page {page_num+1}, image {img_index}: {img_error}")
+                    
+                    if len(pending_images) >= OCR_BATCH_SIZE:
+                        ocr_futures.append(executor.submit(self._ocr_image_batch, pending_images))
+                        pending_images = []
+                        
+                        # Keep at most one batch per worker in memory
+                        while len(ocr_futures) > IMAGE_OCR_WORKERS:
+                            batch_text, batch_ok = ocr_futures.popleft().result()
+                            all_images_text.extend(batch_text)
+                            ocr_errors += not batch_ok
+            
+            if pending_images:
+                ocr_futures.append(executor.submit(self._ocr_image_batch, pending_images))
+            while ocr_futures:
+                batch_text, batch_ok = ocr_futures.popleft().result()
+                all_images_text.extend(batch_text)
+                ocr_errors += not batch_ok
             
             result['text_content'] = '\n'.join(all_text)
             result['images_text'] = all_images_text
-            doc.close()
+            result['table_pages'] = table_pages
+            result['metadata'] = _info_dict_from_fitz_metadata(doc.metadata)
+            result['ocr_errors'] = ocr_errors
             
         except Exception as e:
             logger.error(f"PyMuPDF extraction failed: {e}")
+            result['method'] = 'pymupdf_failed'
+        finally:
+            # The pool is shared: drop only this document's batches that haven't started
+            for future in ocr_futures:
+                future.cancel()
             
         return result
     
-    def _extract_with_ocr_if_needed(self, pdf_path: str, existing_text: str) -> Dict:
-        """Perform OCR if extracted text is insufficient"""
+    def _ocr_image_batch(self, pending_images: List[Tuple[int, int, 'Image.Image']]) -> Tuple[List[Dict], bool]:
+        """
+        OCR a batch of embedded images in one call (runs on an executor thread)
+        
+        Returns:
+            (OCR'd image entries, whether the OCR call succeeded)
+        """
+        images_text = []
+        ocr_ok = True
+        
+        try:
+            ocr_results = _ocr_images([item[2] for item in pending_images], self.ocr_languages)
+        except Exception as ocr_error:
+            logger.warning(f"Image OCR failed: {ocr_error}")
+            ocr_results = []
+            ocr_ok = False
+        
+        for (page_num, img_index, _), (ocr_text, _) in zip(pending_images, ocr_results):
+            if ocr_text.strip():
+                images_text.append({
+                    'page': page_num + 1,
+                    'image_index': img_index,
+                    'ocr_text': ocr_text.strip(),
+                    'formatted': f"\n=== Image {img_index+1} (Page {page_num+1}) OCR ===\n{ocr_text.strip()}\n"
+                })
+        
+        return images_text, ocr_ok
+    
+    def _extract_with_ocr_if_needed(self, doc, existing_text: str,
+                                    scanned_pages: Optional[List[int]] = None) -> Dict:
+        """
+        Perform OCR on an open PyMuPDF document if extracted text is insufficient
+        
+        Args:
+            doc: Open PyMuPDF document
+            existing_text: Best text extracted so far
+            scanned_pages: 1-based pages pdfplumber found without text (None = unknown,
+                check the first pages)
+        """
         result = {
             'text_content': '',
             'method': 'ocr',
@@ -241,36 +732,64 @@ class EnhancedPDFProcessor:
             result['was_needed'] = True
             
             try:
-                doc = fitz.open(pdf_path)
-                ocr_pages = []
+                # Limit to 10 pages for cost control
+                if scanned_pages is not None:
+                    candidate_pages = [page - 1 for page in scanned_pages[:10]]
+                else:
+                    candidate_pages = list(range(min(doc.page_count, 10)))
                 
-                for page_num in range(min(doc.page_count, 10)):  # Limit to first 10 pages for cost control
-                    page = doc[page_num]
-                    
-                    # Convert page to image
-                    pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x resolution for better OCR
-                    img_data = pix.tobytes("ppm")
-                    pil_image = Image.open(fitz.io.BytesIO(img_data))
-                    
-                    # OCR
-                    ocr_text = pytesseract.image_to_string(pil_image, lang=self.ocr_languages)
-                    if ocr_text.strip():
-                        ocr_pages.append(f"\n--- Page {page_num + 1} (OCR) ---\n{ocr_text}")
-                    
-                    pix = None  # Free memory
+                # Only render pages without a usable text layer; get_text is far cheaper than OCR
+                native_pages = {}
+                scan_pages = []
+                for page_num in candidate_pages:
+                    native_text = doc[page_num].get_text("text")
+                    if len(native_text.strip()) >= 50:
+                        native_pages[page_num] = native_text
+                    else:
+                        scan_pages.append(page_num)
+                
+                ocr_texts = dict(zip(scan_pages, self._ocr_pages_in_parallel(doc, scan_pages)))
+                
+                ocr_pages = []
+                for page_num in candidate_pages:
+                    if page_num in native_pages:
+                        ocr_pages.append(f"\n--- Page {page_num + 1} ---\n{native_pages[page_num]}")
+                    elif ocr_texts.get(page_num, '').strip():
+                        ocr_pages.append(f"\n--- Page {page_num + 1} (OCR) ---\n{ocr_texts[page_num]}")
                 
                 result['text_content'] = '\n'.join(ocr_pages)
-                doc.close()
                 
                 logger.info(f"✅ OCR completed: {len(result['text_content'])} characters extracted")
                 
             except Exception as e:
                 logger.error(f"OCR processing failed: {e}")
                 result['text_content'] = f"OCR failed: {str(e)}"
+                result['method'] = 'ocr_failed'
         
         return result
     
-    def _combine_extraction_results(self, plumber_result: Dict, pymupdf_result: Dict, ocr_result: Dict) -> Dict:
+    def _ocr_pages_in_parallel(self, doc, page_nums: List[int]) -> List[str]:
+        """OCR the given (0-based) pages, splitting them into one contiguous batch per worker"""
+        page_count = len(page_nums)
+        if page_count == 0:
+            return []
+        if page_count <= PARALLEL_PAGE_THRESHOLD:
+            return _ocr_document_pages(doc, page_nums, OCR_ZOOM, self.ocr_languages)
+        
+        # Workers re-open the file by path; the open document stays in this process
+        chunk_size = -(-page_count // MAX_PDF_WORKERS)  # ceil division
+        chunks = [page_nums[i:i + chunk_size] for i in range(0, page_count, chunk_size)]
+        worker = partial(_ocr_page_range, doc.name, zoom=OCR_ZOOM, lang=self.ocr_languages)
+        
+        try:
+            with ProcessPoolExecutor(max_workers=len(chunks), initializer=_limit_ocr_threads) as executor:
+                return [text for chunk_texts in executor.map(worker, chunks) for text in chunk_texts]
+        except Exception as e:
+            logger.warning(f"Parallel OCR failed ({e}), processing sequentially")
+            return _ocr_document_pages(doc, page_nums, OCR_ZOOM, self.ocr_languages)
+    
+    def _combine_extraction_results(self, plumber_result: Dict, pymupdf_result: Dict, ocr_result: Dict,
+                                    pdfium_result: Optional[Dict] = None) -> Dict:
         """Intelligently combine results from different extraction methods"""
         combined = {
             'text_content': '',
@@ -284,6 +803,7 @@ class EnhancedPDFProcessor:
         
         # Choose best text extraction
         plumber_text = plumber_result.get('text_content', '')
+        pdfium_text = (pdfium_result or {}).get('text_content', '')
         pymupdf_text = pymupdf_result.get('text_content', '')
         ocr_text = ocr_result.get('text_content', '')
         
@@ -295,6 +815,12 @@ class EnhancedPDFProcessor:
             combined['extraction_method'].append('pdfplumber')
             combined['quality_score'] += 0.4
             
+        elif len(pdfium_text) > 100:  # pdfium2 text engine
+            text_parts.append("=== MAIN CONTENT ===")
+            text_parts.append(pdfium_text)
+            combined['extraction_method'].append('pdfium2')
+            combined['quality_score'] += 0.4
+            
         elif len(pymupdf_text) > 100:  # PyMuPDF as fallback
             text_parts.append("=== MAIN CONTENT (PyMuPDF) ===")
             text_parts.append(pymupdf_text)
@@ -310,8 +836,7 @@ class EnhancedPDFProcessor:
         # Add tables as text
         if combined['tables']:
             text_parts.append("=== EXTRACTED TABLES ===")
-            for table in combined['tables']:
-                text_parts.append(table['text_representation'])
+            text_parts.extend(table['text_representation'] for table in combined['tables'])
             combined['quality_score'] += 0.3
         
         # Add image OCR text
@@ -335,25 +860,15 @@ class EnhancedPDFProcessor:
         
         # Clean up text
         # Remove excessive whitespace
-        text = re.sub(r'\n\s*\n\s*\n', '\n\n', text)
-        text = re.sub(r' +', ' ', text)
-        
-        # Structure content into sections
-        sections = []
-        current_section = ""
-        
-        for line in text.split('\n'):
-            if line.strip().startswith('---') or line.strip().startswith('==='):
-                if current_section.strip():
-                    sections.append(current_section.strip())
-                current_section = line + '\n'
-            else:
-                current_section += line + '\n'
+        text = _RE_BLANK_LINES.sub('\n\n', text)
+        # Collapse runs of spaces with C-level str.replace; each pass halves every run
+        while '  ' in text:
+            text = text.replace('  ', ' ')
         
-        if current_section.strip():
-            sections.append(current_section.strip())
+        # Structure content into sections, each starting at a marker line
+        sections = [section.strip() for section in _RE_SECTION_BREAK.split(text)]
         
-        result['structured_sections'] = sections
+        result['structured_sections'] = [section for section in sections if section]
         result['text_content'] = text
         
         return result
@@ -394,4 +909,15 @@ def get_detailed_pdf_content(filepath: str) -> Dict:
     Use this for advanced processing
     """
     processor = EnhancedPDFProcessor()
-    return processor.extract_comprehensive_content(filepath)
\ No newline at end of file
+    return processor.extract_comprehensive_content(filepath)
+
+
+# Async entry points: the parse runs in a worker thread so the event loop keeps serving requests
+async def aget_text_from_pdf(filepath: str) -> str:
+    """Async variant of get_text_from_pdf for callers running in an event loop"""
+    return await asyncio.to_thread(get_text_from_pdf, filepath)
+
+
+async def aget_detailed_pdf_content(filepath: str) -> Dict:
+    """Async variant of get_detailed_pdf_content for callers running in an event loop"""
+    return await asyncio.to_thread(get_detailed_pdf_content, filepath)
@@ -2,110 +2,566 @@
 
 from sentence_transformers import SentenceTransformer
 import chromadb
+import numpy as np
+import torch
+import importlib.util
 import json
 import os
+import platform
 from datetime import datetime
 import hashlib
-from typing import List, Dict, Any, Optional
+import re
+import string
+import threading
+import queue
+import time
+import zlib
+import atexit
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
 import logging
 
+# Optional: C JSON (de)serializer for metadata blobs
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Optional: Aho-Corasick automaton for single-pass domain keyword matching
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Optional: product quantization of the in-memory vector mirror for large collections
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+# Optional: model2vec static embeddings (no transformer forward pass) for CPU-only deployments
+try:
+    from model2vec import StaticModel
+    MODEL2VEC_AVAILABLE = True
+except ImportError:
+    MODEL2VEC_AVAILABLE = False
+
+# Optional: JIT-compiled, parallel Hamming scan over the binary index
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    prange = range
+    NUMBA_AVAILABLE = False
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+EMBEDDING_MODEL_NAME = "all-mpnet-base-v2"  # Better than all-MiniLM-L6-v2
+MODEL2VEC_MODEL_NAME = "minishlab/potion-base-8M"  # Static token embeddings, ~100x faster on CPU
+EMBEDDING_BACKENDS = ("mpnet", "model2vec")
+
+# Intra-op threads for the PyTorch encoder; more than ~8 gains little and starves request threads
+torch.set_num_threads(min(8, os.cpu_count() or 1))
+
+# Cold ingests larger than this are encoded across a pool of CPU worker processes
+MULTI_PROCESS_ENCODE_THRESHOLD = 256
+MAX_ENCODE_PROCESSES = min(4, os.cpu_count() or 1)
+
+# Story embeddings kept in memory (768 float32 = 3 KB each), keyed by a BLAKE2b digest of the text
+EMBEDDING_CACHE_SIZE = 4096
+
+# Stories per encode/write step when ingesting; writes of one chunk overlap encoding of the next
+INGEST_CHUNK_SIZE = 128
+
+# Queued feedback is written in batches of up to this many events, at most this many seconds apart
+FEEDBACK_BATCH_SIZE = 32
+FEEDBACK_FLUSH_INTERVAL = 0.5
+# Longest shutdown waits for the writer to flush; anything still queued after that is dropped
+FEEDBACK_CLOSE_TIMEOUT = 10.0
+
+# Keyword extraction: whole words of 3+ characters minus common story filler
+_KEYWORD_RE = re.compile(r'\b\w{3,}\b')
+_KEYWORD_STOP_WORDS = frozenset({'i', 'want', 'to', 'so', 'that', 'as', 'a', 'an', 'the', 'and', 'or', 'but'})
+
+def _story_keywords(story_lower: str) -> Tuple[str, ...]:
+    """Ten most frequent keywords of a lowercased story"""
+    words = [word for word in _KEYWORD_RE.findall(story_lower) if word not in _KEYWORD_STOP_WORDS]
+    return tuple(word for word, _ in Counter(words).most_common(10))
+
+# Domain keywords in priority order: the first domain with any matching keyword wins
+DOMAIN_KEYWORDS = {
+    'ecommerce': ['cart', 'product', 'checkout', 'order', 'purchase', 'shop', 'inventory'],
+    'authentication': ['login', 'password', 'user', 'account', 'register', 'auth'],
+    'finance': ['payment', 'transaction', 'billing', 'invoice', 'money', 'credit'],
+    'social': ['post', 'comment', 'like', 'share', 'follow', 'message'],
+    'search': ['search', 'filter', 'sort', 'query', 'results'],
+    'mobile': ['mobile', 'app', 'swipe', 'touch', 'notification'],
+    'ui_ux': ['click', 'button', 'form', 'page', 'navigate', 'interface']
+}
+
+def _build_domain_automaton():
+    """Compile every domain keyword into one automaton, tagged with its domain's priority"""
+    automaton = ahocorasick.Automaton()
+    for priority, (domain, keywords) in enumerate(DOMAIN_KEYWORDS.items()):
+        for keyword in keywords:
+            automaton.add_word(keyword, (priority, domain))
+    automaton.make_automaton()
+    return automaton
+
+_DOMAIN_AUTOMATON = _build_domain_automaton() if AHOCORASICK_AVAILABLE else None
+
+def _story_domain(story_lower: str) -> str:
+    """Domain/category of a lowercased story by keyword substring match"""
+    if _DOMAIN_AUTOMATON is not None:
+        # One scan finds all keyword occurrences; keep the highest-priority domain
+        hits = (value for _, value in _DOMAIN_AUTOMATON.iter(story_lower))
+        return min(hits, default=(None, 'general'))[1]
+    
+    for domain, keywords in DOMAIN_KEYWORDS.items():
+        if any(keyword in story_lower for keyword in keywords):
+            return domain
+    
+    return 'general'
+
+_COMPLEXITY_INDICATORS = ('integrate', 'multiple', 'complex', 'advanced', 'system')
+
+@lru_cache(maxsize=8192)
+def _analyze_story(story: str) -> Tuple[str, Tuple[str, ...], float]:
+    """Domain, top keywords and complexity score of a story from one lowercase pass (memoized per story)"""
+    story_lower = story.lower()
+    
+    # Simple complexity scoring based on length and specific indicators
+    complexity_bonus = sum(1 for indicator in _COMPLEXITY_INDICATORS if indicator in story_lower)
+    complexity_score = min(1.0, (len(story.split()) / 100) + (complexity_bonus * 0.2))
+    
+    return _story_domain(story_lower), _story_keywords(story_lower), complexity_score
+
+def _keyword_bits(keywords) -> int:
+    """63-bit signature of a keyword set: disjoint signatures guarantee zero overlap (fits a sqlite integer)"""
+    bits = 0
+    for keyword in keywords:
+        # CRC32, not hash(): str hashes are salted per process and the bits are persisted
+        bits |= 1 << (zlib.crc32(keyword.encode()) % 63)
+    return bits
+
+@lru_cache(maxsize=8192)
+def _keyword_set(keywords_csv: str) -> frozenset:
+    """Parsed keyword set of a stored story (metadata 'keywords' string), built once per distinct value"""
+    return frozenset(keywords_csv.split(',')) if keywords_csv else frozenset()
+
+def _with_kw_bits(metadata: Dict) -> Dict:
+    """Give rows stored before kw_bits existed their signature once, not on every query"""
+    if 'kw_bits' not in metadata:
+        metadata['kw_bits'] = _keyword_bits(_keyword_set(metadata.get('keywords', '')))
+    return metadata
+
+# 🎯 Common feedback patterns for _analyze_feedback_sentiment
+_POSITIVE_WORDS = frozenset({"good", "great", "excellent", "comprehensive", "thorough", "detailed"})
+_NEGATIVE_WORDS = frozenset({"poor", "bad", "incomplete", "missing", "lacking", "insufficient"})
+_SUGGESTION_WORDS = frozenset({"should", "could", "need", "add", "include", "consider", "improve"})
+_STRIP_PUNCTUATION = str.maketrans('', '', string.punctuation)
+
+_json_loads = orjson.loads if ORJSON_AVAILABLE else json.loads
+
+# hashlib's usedforsecurity flag exists from Python 3.9; 3.8 hosts hash without it
+_MD5_NOT_FOR_SECURITY = {'usedforsecurity': False} if sys.version_info >= (3, 9) else {}
+
+def _json_dumps(value: Any) -> str:
+    """Serialize to a JSON string for Chroma metadata (orjson when installed)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(value)
+
+def _testcases_metadata(test_cases: List[Dict]) -> Dict[str, str]:
+    """Serialized test cases plus a content hash, so readers can skip blobs they've already merged"""
+    blob = _json_dumps(test_cases)  # Serialize to JSON string
+    return {
+        "testCases": blob,
+        "testcases_hash": hashlib.blake2b(blob.encode(), digest_size=8).hexdigest()
+    }
+
+def _select_device() -> str:
+    """Embedding device: RAG_DEVICE override, else CUDA, then Apple MPS, then CPU"""
+    device = os.getenv("RAG_DEVICE")
+    if device:
+        return device
+    if torch.cuda.is_available():
+        return "cuda"
+    if torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+def _onnx_model_files() -> List[str]:
+    """ONNX exports to try on this CPU: dynamic INT8 for its instruction set first, then FP32 O3"""
+    machine = platform.machine().lower()
+    if machine in ('arm64', 'aarch64'):
+        return ["onnx/model_qint8_arm64.onnx", "onnx/model_O3.onnx"]
+    
+    try:
+        with open('/proc/cpuinfo') as f:
+            cpu_flags = set(f.read().split())
+    except OSError:
+        cpu_flags = set()
+    
+    if 'avx512_vnni' in cpu_flags:
+        return ["onnx/model_qint8_avx512_vnni.onnx", "onnx/model_O3.onnx"]
+    if 'avx512f' in cpu_flags:
+        return ["onnx/model_qint8_avx512.onnx", "onnx/model_O3.onnx"]
+    if 'avx2' in cpu_flags:
+        return ["onnx/model_quint8_avx2.onnx", "onnx/model_O3.onnx"]
+    return ["onnx/model_O3.onnx"]
+
+def _load_embedding_model() -> SentenceTransformer:
+    """Load the sentence model on the fastest device/runtime available on this host"""
+    device = _select_device()
+    
+    if device != "cpu":
+        # FP16 roughly halves accelerator encode latency with negligible embedding drift
+        logger.info(f"🚀 Loading embedding model on {device} (FP16)")
+        return SentenceTransformer(EMBEDDING_MODEL_NAME, device=device).half()
+    
+    # ONNX Runtime (sentence-transformers>=3.2 with optimum installed): INT8 GEMMs roughly halve
+    # CPU latency; the model repo ships pre-quantized exports per instruction set
+    if importlib.util.find_spec("onnxruntime") is not None and importlib.util.find_spec("optimum") is not None:
+        for file_name in _onnx_model_files():
+            try:
+                model = SentenceTransformer(EMBEDDING_MODEL_NAME, backend="onnx",
+                                            model_kwargs={"file_name": file_name})
+                logger.info(f"🚀 Loading embedding model on cpu with ONNX Runtime ({file_name})")
+                return model
+            except Exception as e:
+                logger.warning(f"ONNX embedding model {file_name} unavailable ({e})")
+        logger.warning("Falling back to the PyTorch embedding model")
+    
+    logger.info("Loading embedding model on cpu")
+    return SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
+
+class _StaticEmbeddingModel:
+    """model2vec StaticModel behind the part of the SentenceTransformer encode API used here"""
+    device = torch.device("cpu")
+    
+    def __init__(self, model_name: str):
+        self._model = StaticModel.from_pretrained(model_name)
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._model.dim
+    
+    def encode(self, sentences, normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        # Token lookups and a mean: transformer batch sizes don't apply, the library default does
+        embeddings = np.asarray(self._model.encode(sentences), dtype=np.float32)
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+            embeddings = embeddings / np.maximum(norms, 1e-12)
+        return embeddings
+
+# Two-stage retrieval: Hamming search over packed sign bits (96 bytes per 768-d vector),
+# then cosine rescoring of BINARY_OVERCAPTURE x the requested candidates
+BINARY_OVERCAPTURE = 4
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def _binary_codes(embeddings: np.ndarray) -> np.ndarray:
+    """Pack the sign bit of every embedding dimension into bytes"""
+    return np.packbits(np.asarray(embeddings) > 0, axis=-1)
+
+def _hamming_loop(codes, query_code, popcount_table):
+    """Hamming distance of every packed code to the query, streaming the index exactly once"""
+    n_rows, width = codes.shape
+    distances = np.empty(n_rows, dtype=np.int32)
+    for i in prange(n_rows):
+        total = 0
+        for j in range(width):
+            total += popcount_table[codes[i, j] ^ query_code[j]]
+        distances[i] = total
+    return distances
+
+def _hamming_numpy(codes, query_code, popcount_table):
+    """Vectorized fallback for hamming_distances when Numba is not installed"""
+    return popcount_table[np.bitwise_xor(codes, query_code)].sum(axis=1)
+
+hamming_distances = njit(parallel=True, cache=True)(_hamming_loop) if NUMBA_AVAILABLE else _hamming_numpy
+
+# Product quantization: 8-dim sub-vectors x 256 centroids = 1 byte per 8 dims (96 bytes per
+# 768-d vector instead of 3 KB). Only worth training once the collection is large.
+PQ_SUBVECTOR_DIM = 8
+PQ_MIN_STORIES = 10000
+PQ_MAX_TRAINING_VECTORS = 20000
+
+def _train_product_quantizer(unit_vectors: np.ndarray):
+    """Train a faiss ProductQuantizer on (a sample of) the stored unit vectors"""
+    dim = unit_vectors.shape[1]
+    pq = faiss.ProductQuantizer(dim, dim // PQ_SUBVECTOR_DIM, 8)
+    if len(unit_vectors) > PQ_MAX_TRAINING_VECTORS:
+        sample = np.random.default_rng(0).choice(len(unit_vectors), PQ_MAX_TRAINING_VECTORS, replace=False)
+        unit_vectors = unit_vectors[sample]
+    pq.train(np.ascontiguousarray(unit_vectors, dtype=np.float32))
+    return pq
+
+# Chroma >= 0.6 takes embeddings as numpy arrays; older releases validate for nested lists
+_CHROMA_ACCEPTS_NDARRAY = tuple(int(part) for part in re.findall(r'\d+', chromadb.__version__)[:2]) >= (0, 6)
+
+def _chroma_embeddings(vectors) -> Any:
+    """2-D float32 embeddings in the form the installed Chroma accepts (no per-float list copy when possible)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors if _CHROMA_ACCEPTS_NDARRAY else vectors.tolist()
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize each row so a dot product is the cosine similarity"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+# Retrieval runs over the in-memory mirror (_query_binary_then_rescore), never collection.query,
+# so the HNSW index keeps Chroma's default build parameters and the original cosine space
+# (matching collections persisted before the mirror existed).
+def _hnsw_metadata(embedding_backend: str) -> Dict[str, Any]:
+    """Collection metadata: cosine HNSW space, tagged with the embedding backend"""
+    return {
+        "embedding_backend": embedding_backend,
+        "hnsw:space": "cosine",
+    }
+
 class EnhancedRAGHelper:
-    def __init__(self, db_path: str = "./chroma_db", collection_name: str = "testcases"):
+    def __init__(self, db_path: str = "./chroma_db", collection_name: str = "testcases",
+                 embedding_backend: Optional[str] = None):
         """
         Initialize enhanced RAG system with persistent storage and learning capabilities
+        
+        Args:
+            db_path: ChromaDB persistence directory
+            collection_name: Main story collection
+            embedding_backend: "mpnet" (default) or "model2vec"; defaults to $RAG_EMBEDDING_BACKEND
         """
-        # Use better embedding model for improved accuracy
-        self.model = SentenceTransformer("all-mpnet-base-v2")  # Better than all-MiniLM-L6-v2
+        embedding_backend = embedding_backend or os.getenv("RAG_EMBEDDING_BACKEND", "mpnet")
+        if embedding_backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown embedding backend {embedding_backend!r}, expected one of {EMBEDDING_BACKENDS}")
+        if embedding_backend == "model2vec" and not MODEL2VEC_AVAILABLE:
+            logger.warning("model2vec is not installed, using the mpnet embedding model")
+            embedding_backend = "mpnet"
+        self.embedding_backend = embedding_backend
+        
+        if embedding_backend == "model2vec":
+            self.embedding_model_name = MODEL2VEC_MODEL_NAME
+            logger.info(f"🚀 Loading static embedding model {MODEL2VEC_MODEL_NAME}")
+            self.model = _StaticEmbeddingModel(MODEL2VEC_MODEL_NAME)
+        else:
+            # Use better embedding model for improved accuracy
+            self.embedding_model_name = EMBEDDING_MODEL_NAME
+            self.model = _load_embedding_model()
+        
+        self._embedding_dim = self.model.get_sentence_embedding_dimension()
+        
+        # Vectors of different models live in different spaces (and dimensions): never share collections
+        suffix = "" if embedding_backend == "mpnet" else f"_{embedding_backend}"
         
         # Persistent ChromaDB client
         self.client = chromadb.PersistentClient(path=db_path)
         self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            metadata={"hnsw:space": "cosine"}  # Better for sentence embeddings
+            name=collection_name + suffix,
+            metadata=_hnsw_metadata(embedding_backend)  # Better for sentence embeddings
         )
         
         # Learning system collections
         self.feedback_collection = self.client.get_or_create_collection(
-            name="feedback_data",
-            metadata={"hnsw:space": "cosine"}
+            name="feedback_data" + suffix,
+            metadata=_hnsw_metadata(embedding_backend)
         )
         
         self.context_collection = self.client.get_or_create_collection(
-            name="story_contexts",
-            metadata={"hnsw:space": "cosine"}
+            name="story_contexts" + suffix,
+            metadata=_hnsw_metadata(embedding_backend)
         )
         
+        # LRU of recent story embeddings: the same story is typically retrieved, then stored
+        self._embedding_cache = OrderedDict()
+        self._embedding_cache_lock = threading.Lock()
+        
+        # In-memory mirror of the main collection, loaded on first retrieval (and topped up when
+        # the collection grows) so queries never go back to Chroma: row-aligned ids, sign-bit codes, unit vectors, metadata, documents
+        self._index_ids = []
+        self._index_rows = {}  # Chroma id -> row
+        self._index_codes = None  # (n, dim/8) uint8; None until loaded
+        self._index_vectors = None  # (n, dim) float32, or (n, dim/8) PQ codes when _index_pq is set
+        self._index_pq = None  # faiss ProductQuantizer for large collections
+        self._index_metadatas = []
+        self._index_documents = []  # Not used by retrieval; served to feedback writers by _get_stories_by_id
+        self._index_lock = threading.Lock()
+        
+        # Feedback writes happen off the request thread, batched by a single writer thread
+        self._feedback_queue = queue.Queue()
+        self._feedback_thread = threading.Thread(target=self._feedback_writer_loop,
+                                                 name="rag-feedback-writer", daemon=True)
+        self._feedback_thread.start()
+        
         logger.info("Enhanced RAG system initialized with persistent storage")
     
+    def _encode_cached(self, text: str) -> np.ndarray:
+        """Encode text with the sentence model, reusing the vector for recently seen text"""
+        key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+        with self._embedding_cache_lock:
+            embedding = self._embedding_cache.get(key)
+            if embedding is not None:
+                self._embedding_cache.move_to_end(key)
+                return embedding
+        
+        embedding = self.model.encode(text, convert_to_numpy=True,
+                                      normalize_embeddings=True).astype(np.float32, copy=False)
+        embedding.setflags(write=False)  # Shared between callers
+        
+        with self._embedding_cache_lock:
+            self._embedding_cache[key] = embedding
+            if len(self._embedding_cache) > EMBEDDING_CACHE_SIZE:
+                self._embedding_cache.popitem(last=False)
+        return embedding
+    
+    def _encode_many(self, texts: List[str], pool=None) -> np.ndarray:
+        """Batch-encode texts, on a multi-process pool when one is given"""
+        if pool is not None:
+            try:
+                return self.model.encode_multi_process(texts, pool, batch_size=32, normalize_embeddings=True)
+            except Exception as e:
+                logger.warning(f"Multi-process encoding failed ({e}), encoding in-process")
+        
+        return self.model.encode(texts, batch_size=64, show_progress_bar=False, convert_to_numpy=True,
+                                 normalize_embeddings=True)
+    
+    def _start_encode_pool(self, num_texts: int):
+        """Multi-process encode pool for large CPU jobs (None when in-process encoding is the better fit)"""
+        use_pool = (num_texts > MULTI_PROCESS_ENCODE_THRESHOLD and MAX_ENCODE_PROCESSES > 1
+                    and isinstance(self.model, SentenceTransformer) and self.model.device.type == 'cpu')
+        if not use_pool:
+            return None
+        try:
+            # Tokenization and pre-processing hold the GIL, so processes scale where threads don't
+            return self.model.start_multi_process_pool(['cpu'] * MAX_ENCODE_PROCESSES)
+        except Exception as e:
+            logger.warning(f"Multi-process encode pool unavailable ({e}), encoding in-process")
+            return None
+    
+    def _write_stories(self, ids: List[str], embeddings: np.ndarray, metadatas: List[Dict], documents: List[str]):
+        """Add stories to the collection and the in-memory index"""
+        self.collection.add(
+            documents=documents,
+            embeddings=_chroma_embeddings(embeddings),
+            metadatas=metadatas,
+            ids=ids
+        )
+        self._index_add(ids, embeddings, metadatas, documents)
+    
     def ingest_testcases_from_json(self, filepath: str):
         """Load sample test cases with enhanced metadata"""
         with open(filepath, 'r') as f:
             examples = json.load(f)
         
-        for i, item in enumerate(examples):
-            story = item['userStory']
-            test_cases = item['testCases']
-            
-            # Create richer embeddings
-            embedding = self.model.encode(story).tolist()
-            
-            # Enhanced metadata with keywords and domain info (ChromaDB compatible)
-            metadata = {
-                "testCases": json.dumps(test_cases),  # Serialize to JSON string
-                "domain": self._extract_domain(story),
-                "keywords": ",".join(self._extract_keywords(story)),  # Join as string
-                "num_testcases": len(test_cases),
-                "ingestion_date": datetime.now().isoformat(),
-                "source": "sample_data"
-            }
-            
-            self.collection.add(
-                documents=[story],
-                embeddings=[embedding],
-                metadatas=[metadata],
-                ids=[f"sample_{i}"]
-            )
+        if not examples:
+            logger.info("No sample user stories to ingest")
+            return
+        
+        # Stories are keyed by content hash like generated ones, so feedback can address them by id;
+        # a story listed twice is stored once
+        unique_examples = {}
+        for item in examples:
+            unique_examples.setdefault(self._generate_story_id(item['userStory']), item)
+        ids = list(unique_examples)
+        stories = [item['userStory'] for item in unique_examples.values()]
+        
+        # Enhanced metadata with keywords and domain info (ChromaDB compatible)
+        ingestion_date = datetime.now().isoformat()
+        metadatas = []
+        for story, item in zip(stories, unique_examples.values()):
+            domain, keywords, complexity_score = _analyze_story(story)
+            metadatas.append({
+                **_testcases_metadata(item['testCases']),
+                "domain": domain,
+                "keywords": ",".join(keywords),  # Join as string
+                "kw_bits": _keyword_bits(keywords),
+                "num_testcases": len(item['testCases']),
+                "ingestion_date": ingestion_date,
+                "source": "sample_data",
+                "story_length": len(story),
+                "complexity_score": complexity_score
+            })
+        
+        # Encode chunk i while chunk i-1 is written: the sqlite/HNSW insert runs in C and overlaps
+        # with encoding; at most one write is in flight so memory stays bounded
+        pool = self._start_encode_pool(len(stories))
+        try:
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-ingest") as writer:
+                pending = None
+                for start in range(0, len(ids), INGEST_CHUNK_SIZE):
+                    chunk = slice(start, start + INGEST_CHUNK_SIZE)
+                    embeddings = self._encode_many(stories[chunk], pool)
+                    if pending is not None:
+                        pending.result()
+                    pending = writer.submit(self._write_stories, ids[chunk], embeddings,
+                                            metadatas[chunk], stories[chunk])
+                pending.result()
+        finally:
+            if pool is not None:
+                self.model.stop_multi_process_pool(pool)
         
-        logger.info(f"✅ Ingested {len(examples)} sample user stories")
+        logger.info(f"✅ Ingested {len(stories)} sample user stories")
     
     def add_generated_story_context(self, user_story: str, generated_testcases: List[Dict], 
                                   feedback_score: Optional[float] = None):
         """
         Add newly generated test cases to the knowledge base for future learning
         """
+        self.add_generated_story_contexts_batch([(user_story, generated_testcases, feedback_score)])
+    
+    def add_generated_story_contexts_batch(self, items: List[Tuple[str, List[Dict], Optional[float]]]):
+        """
+        Add several generated stories in one collection write
+        
+        Args:
+            items: (user_story, generated_testcases, feedback_score) tuples
+        """
         try:
-            # Create unique ID for this story
-            story_id = self._generate_story_id(user_story)
+            # One row per story id; a later duplicate in the batch wins
+            rows = {}
+            for user_story, generated_testcases, feedback_score in items:
+                rows[self._generate_story_id(user_story)] = (user_story, generated_testcases, feedback_score)
+            if not rows:
+                return
             
-            # Create embedding
-            embedding = self.model.encode(user_story).tolist()
+            ids = list(rows)
+            stories = [rows[story_id][0] for story_id in ids]
+            embeddings = np.stack([self._encode_cached(user_story) for user_story in stories])
+            creation_date = datetime.now().isoformat()
             
             # Enhanced metadata (ChromaDB compatible)
-            metadata = {
-                "testCases": json.dumps(generated_testcases),  # Serialize to JSON string
-                "domain": self._extract_domain(user_story),
-                "keywords": ",".join(self._extract_keywords(user_story)),  # Join as string
-                "num_testcases": len(generated_testcases),
-                "creation_date": datetime.now().isoformat(),
-                "feedback_score": feedback_score or 0.0,  # Ensure numeric
-                "source": "generated",
-                "story_length": len(user_story),
-                "complexity_score": self._calculate_complexity_score(user_story)
-            }
+            metadatas = []
+            for user_story, generated_testcases, feedback_score in rows.values():
+                domain, keywords, complexity_score = _analyze_story(user_story)
+                metadatas.append({
+                    **_testcases_metadata(generated_testcases),
+                    "domain": domain,
+                    "keywords": ",".join(keywords),  # Join as string
+                    "kw_bits": _keyword_bits(keywords),
+                    "num_testcases": len(generated_testcases),
+                    "creation_date": creation_date,
+                    "feedback_score": feedback_score or 0.0,  # Ensure numeric
+                    "source": "generated",
+                    "story_length": len(user_story),
+                    "complexity_score": complexity_score
+                })
             
             # Add to knowledge base
             self.collection.add(
-                documents=[user_story],
-                embeddings=[embedding],
-                metadatas=[metadata],
-                ids=[story_id]
+                documents=stories,
+                embeddings=_chroma_embeddings(embeddings),
+                metadatas=metadatas,
+                ids=ids
             )
+            self._index_add(ids, embeddings, metadatas, stories)
             
-            logger.info(f"✅ Added new story context: {story_id}")
+            logger.info(f"✅ Added {len(ids)} new story context(s): {', '.join(ids[:5])}")
             
         except Exception as e:
             logger.error(f"Failed to add story context: {e}")
@@ -115,56 +571,60 @@ class EnhancedRAGHelper:
         Enhanced retrieval with contextual understanding and quality scoring
         """
         try:
-            query_embedding = self.model.encode(user_story).tolist()
+            query_embedding = self._encode_cached(user_story)
             
             # Get more candidates for better filtering
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=min(top_k * 3, 20),  # Get more candidates
-                include=['metadatas', 'documents', 'distances']
+            results = self._query_binary_then_rescore(
+                query_embedding,
+                n_results=min(top_k * 3, 20)  # Get more candidates
             )
             
-            # Extract and score results
-            scored_results = []
-            story_domain = self._extract_domain(user_story)
-            story_keywords = self._extract_keywords(user_story)
-            
-            for i, (metadata, distance, document) in enumerate(zip(
-                results['metadatas'][0], results['distances'][0], results['documents'][0]
-            )):
-                # Calculate relevance score
-                relevance_score = self._calculate_relevance_score(
-                    user_story, document, metadata, distance, story_domain, story_keywords
-                )
-                
-                scored_results.append({
-                    'metadata': metadata,
-                    'document': document,
-                    'distance': distance,
-                    'relevance_score': relevance_score
-                })
+            # Score all candidates at once
+            metadatas = results['metadatas'][0]
+            distances = results['distances'][0]
+            story_domain, story_keywords, _ = _analyze_story(user_story)
+            story_keywords = frozenset(story_keywords)  # Built once, not per candidate
+            
+            relevance_scores = self._calculate_relevance_scores(
+                metadatas, distances, story_domain, story_keywords
+            )
             
-            # Sort by relevance score and take top results
-            scored_results.sort(key=lambda x: x['relevance_score'], reverse=True)
+            # Rank by relevance score (stable, like list.sort); only the top results are materialized
+            scored_results = [
+                {
+                    'metadata': metadatas[i],
+                    'distance': distances[i],
+                    'relevance_score': float(relevance_scores[i])
+                }
+                for i in np.argsort(-relevance_scores, kind='stable')[:top_k]
+            ]
             
-            # Extract test cases from top results
-            combined_test_cases = []
-            seen_ids = set()
+            # Extract test cases from top results: first case per id wins, in rank order
+            merged_cases = {}
+            seen_blobs = set()  # Identical test-case blobs contribute nothing new after the first
             
-            for result in scored_results[:top_k]:
+            for result in scored_results:
                 test_cases_str = result['metadata'].get('testCases', '[]')
+                blob_key = result['metadata'].get('testcases_hash') or test_cases_str
+                if isinstance(blob_key, str):
+                    if blob_key in seen_blobs:
+                        continue
+                    seen_blobs.add(blob_key)
+                
                 try:
-                    test_cases = json.loads(test_cases_str) if isinstance(test_cases_str, str) else test_cases_str
+                    test_cases = _json_loads(test_cases_str) if isinstance(test_cases_str, str) else test_cases_str
                 except:
                     test_cases = []
                 
+                relevance_score = result['relevance_score']
                 for case in test_cases:
                     case_id = case.get('id')
-                    if case_id not in seen_ids:
+                    if case_id not in merged_cases:
                         # Add context score to test case
-                        case['context_relevance'] = result['relevance_score']
-                        combined_test_cases.append(case)
-                        seen_ids.add(case_id)
+                        case['context_relevance'] = relevance_score
+                        merged_cases[case_id] = case
+            
+            combined_test_cases = list(merged_cases.values())
             
             # Add intelligent edge cases if needed
             if len(combined_test_cases) < top_k:
@@ -178,15 +638,158 @@ class EnhancedRAGHelper:
             logger.error(f"Error in similarity retrieval: {e}")
             return self._get_fallback_cases()
     
+    def _ensure_index(self):
+        """
+        Mirror the main collection on first use: sign bits and unit vectors for retrieval,
+        metadata for scoring, and documents for the id lookups in _get_stories_by_id.
+        
+        Later calls compare the collection's row count with the mirror's (one cheap count
+        query) so stories written by another process or helper on the same db_path are
+        picked up: new rows are appended, and a shrunken collection is reloaded.
+        """
+        with self._index_lock:
+            if self._index_codes is None:
+                self._load_index()
+                return
+            mirrored = len(self._index_ids)
+        
+        stored_count = self.collection.count()
+        if stored_count == mirrored:
+            return
+        
+        if stored_count < mirrored:
+            # Rows were deleted behind our back; positions are no longer valid, so start over
+            with self._index_lock:
+                self._load_index()
+            return
+        
+        stored_ids = self.collection.get(include=[])['ids']
+        with self._index_lock:
+            missing = [story_id for story_id in stored_ids if story_id not in self._index_rows]
+        if not missing:
+            return
+        
+        stored = self.collection.get(ids=missing, include=['embeddings', 'metadatas', 'documents'])
+        metadatas = [_with_kw_bits(metadata) for metadata in stored['metadatas']]
+        self._index_add(list(stored['ids']), stored['embeddings'], metadatas, list(stored['documents']))
+        logger.info(f"🔢 Appended {len(stored['ids'])} externally added stories to the retrieval index")
+    
+    def _load_index(self):
+        """(Re)build the whole mirror from the collection; caller holds _index_lock"""
+        self._index_pq = None
+        stored = self.collection.get(include=['embeddings', 'metadatas', 'documents'])
+        self._index_ids = list(stored['ids'])
+        self._index_rows = {story_id: row for row, story_id in enumerate(self._index_ids)}
+        self._index_metadatas = [_with_kw_bits(metadata) for metadata in stored['metadatas']]
+        self._index_documents = list(stored['documents'])
+        if self._index_ids:
+            vectors = np.asarray(stored['embeddings'], dtype=np.float32)
+            self._index_codes = _binary_codes(vectors)
+            unit_vectors = _unit_rows(vectors)
+            if FAISS_AVAILABLE and len(unit_vectors) >= PQ_MIN_STORIES:
+                self._index_pq = _train_product_quantizer(unit_vectors)
+                logger.info("🗜️ Product-quantized the in-memory story vectors")
+            self._index_vectors = self._compress_rows(unit_vectors)
+        else:
+            self._index_codes = np.zeros((0, 0), dtype=np.uint8)
+            self._index_vectors = np.zeros((0, 0), dtype=np.float32)
+        
+        logger.info(f"🔢 Built in-memory retrieval index over {len(self._index_ids)} stories")
+    
+    def _index_add(self, ids: List[str], embeddings, metadatas: List[Dict], documents: List[str]):
+        """Mirror stories just added to the collection into the in-memory index (once it exists)"""
+        with self._index_lock:
+            if self._index_codes is None:
+                return
+            
+            # collection.add ignores ids that already exist, so the index does too
+            new_rows = [i for i, story_id in enumerate(ids) if story_id not in self._index_rows]
+            if not new_rows:
+                return
+            
+            vectors = np.asarray(embeddings, dtype=np.float32)[new_rows]
+            for i in new_rows:
+                self._index_rows[ids[i]] = len(self._index_ids)
+                self._index_ids.append(ids[i])
+                self._index_metadatas.append(metadatas[i])
+                self._index_documents.append(documents[i])
+            if len(self._index_codes):
+                self._index_codes = np.concatenate([self._index_codes, _binary_codes(vectors)])
+                self._index_vectors = np.concatenate([self._index_vectors, self._compress_rows(_unit_rows(vectors))])
+            else:
+                self._index_codes = _binary_codes(vectors)
+                self._index_vectors = self._compress_rows(_unit_rows(vectors))
+    
+    def _compress_rows(self, unit_vectors: np.ndarray) -> np.ndarray:
+        """Storage form of unit vectors in the mirror: PQ codes once a quantizer is trained"""
+        if self._index_pq is None:
+            return unit_vectors
+        return self._index_pq.compute_codes(np.ascontiguousarray(unit_vectors, dtype=np.float32))
+    
+    def _expand_rows(self, stored_rows: np.ndarray, pq) -> np.ndarray:
+        """Unit vectors back from the mirror's storage form (PQ reconstructions are re-normalized)"""
+        if pq is None:
+            return stored_rows
+        return _unit_rows(pq.decode(np.ascontiguousarray(stored_rows)))
+    
+    def _index_update_metadata(self, story_id: str, metadata: Dict):
+        """Keep the mirrored metadata in step with collection.update"""
+        with self._index_lock:
+            row = self._index_rows.get(story_id)
+            if row is not None:
+                self._index_metadatas[row] = metadata
+    
+    def _query_binary_then_rescore(self, query_embedding: np.ndarray, n_results: int) -> Dict:
+        """
+        Nearest stories by Hamming distance over sign bits, rescored with cosine similarity
+        
+        Args:
+            query_embedding: FP32 query vector
+            n_results: Number of candidates to return
+            
+        Returns:
+            Results shaped like collection.query output (one query, metadatas and cosine distances only)
+        """
+        self._ensure_index()
+        # Arrays are replaced (never resized in place) and lists only grow, so a snapshot is consistent
+        with self._index_lock:
+            codes = self._index_codes
+            vectors = self._index_vectors
+            pq = self._index_pq
+            metadatas = self._index_metadatas
+        
+        if not len(codes):
+            return {'metadatas': [[]], 'distances': [[]]}
+        
+        # Stage 1: popcount(xor) over packed bits, overcapturing for the rescore
+        hamming = hamming_distances(codes, _binary_codes(query_embedding), _POPCOUNT_TABLE)
+        n_overcapture = min(n_results * BINARY_OVERCAPTURE, len(codes))
+        candidate_rows = np.argpartition(hamming, n_overcapture - 1)[:n_overcapture]
+        
+        # Stage 2: cosine against the in-memory unit vectors of just those candidates
+        # (exact, or from PQ reconstructions once the collection is large enough to quantize)
+        query_unit = query_embedding / max(float(np.linalg.norm(query_embedding)), 1e-12)
+        cosine = self._expand_rows(vectors[candidate_rows], pq) @ query_unit
+        top = np.argsort(-cosine)[:n_results]
+        
+        return {
+            'metadatas': [[metadatas[candidate_rows[i]] for i in top]],
+            'distances': [[float(1.0 - cosine[i]) for i in top]]
+        }
+    
     def add_feedback(self, story_id: str, testcase_quality_score: float, 
                     user_feedback: str = "", improved_testcases: List[Dict] = None,
                     feedback_categories: List[str] = None, missing_scenarios: List[str] = None):
         """
         Enhanced feedback processing for better learning
+        
+        The feedback record is built here and queued; a background writer thread batches the
+        encodes and collection writes, so the caller returns without waiting on them.
         """
         try:
-            # 🎯 UPDATE ORIGINAL STORY QUALITY SCORE
-            self._update_story_quality_score(story_id, testcase_quality_score)
+            # One timestamp for every record this feedback writes
+            now = datetime.now()
+            now_iso = now.isoformat()
             
             # 📊 ANALYZE FEEDBACK CATEGORIES
             analyzed_feedback = self._analyze_feedback_sentiment(user_feedback)
@@ -195,47 +798,127 @@ class EnhancedRAGHelper:
                 "story_id": story_id,
                 "quality_score": testcase_quality_score,
                 "user_feedback": user_feedback,
-                "improved_testcases": json.dumps(improved_testcases or []),
-                "feedback_categories": json.dumps(feedback_categories or []),
-                "missing_scenarios": json.dumps(missing_scenarios or []),
-                "feedback_date": datetime.now().isoformat(),
-                "sentiment_analysis": json.dumps(analyzed_feedback),
+                "improved_testcases": _json_dumps(improved_testcases or []),
+                "feedback_categories": _json_dumps(feedback_categories or []),
+                "missing_scenarios": _json_dumps(missing_scenarios or []),
+                "feedback_date": now_iso,
+                "feedback_date_ts": now.timestamp(),  # Epoch seconds: trend stats sort on this without parsing
+                "sentiment_analysis": _json_dumps(analyzed_feedback),
                 "feedback_weight": self._calculate_feedback_weight(testcase_quality_score, user_feedback)
             }
             
-            # 🧠 CREATE RICHER EMBEDDING FROM COMPREHENSIVE FEEDBACK
             feedback_text = self._create_enriched_feedback_text(
                 user_feedback, testcase_quality_score, feedback_categories, missing_scenarios
             )
-            embedding = self.model.encode(feedback_text).tolist()
             
-            # 💾 STORE IN FEEDBACK COLLECTION
-            self.feedback_collection.add(
-                documents=[feedback_text],
-                embeddings=[embedding],
-                metadatas=[feedback_data],
-                ids=[f"feedback_{story_id}_{datetime.now().timestamp()}"]
-            )
+            self._feedback_queue.put({
+                "story_id": story_id,
+                "quality_score": testcase_quality_score,
+                "feedback_text": feedback_text,
+                "feedback_data": feedback_data,
+                "improved_testcases": improved_testcases,
+                "feedback_categories": feedback_categories,
+                "now": now
+            })
+            
+        except Exception as e:
+            logger.error(f"Failed to add enhanced feedback: {e}")
+    
+    def _feedback_writer_loop(self):
+        """Drain queued feedback in batches of up to FEEDBACK_BATCH_SIZE or FEEDBACK_FLUSH_INTERVAL seconds"""
+        while True:
+            batch = [self._feedback_queue.get()]
+            deadline = time.monotonic() + FEEDBACK_FLUSH_INTERVAL
+            while len(batch) < FEEDBACK_BATCH_SIZE and batch[-1] is not None:
+                try:
+                    batch.append(self._feedback_queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
             
-            # 🔄 IF HIGH-QUALITY IMPROVED TEST CASES PROVIDED, ADD AS NEW EXAMPLES
-            if improved_testcases and testcase_quality_score >= 4.0:
-                self._add_improved_examples_to_knowledge_base(story_id, improved_testcases)
+            events = [event for event in batch if event is not None]
+            if events:
+                self._commit_feedback_batch(events)
+            if batch[-1] is None:
+                return
+    
+    def _close_feedback_writer(self, timeout: float = FEEDBACK_CLOSE_TIMEOUT):
+        """Flush queued feedback and stop the writer thread, waiting at most timeout seconds"""
+        if not self._feedback_thread.is_alive():
+            return
+        self._feedback_queue.put(None)
+        self._feedback_thread.join(timeout=timeout)
+        if self._feedback_thread.is_alive():
+            # Less the stop sentinel; the batch being written when we gave up isn't counted
+            pending = max(0, self._feedback_queue.qsize() - 1)
+            logger.warning(f"Feedback writer still busy after {timeout:.0f}s; "
+                           f"{pending} queued feedback events will not be saved")
+    
+    def _commit_feedback_batch(self, events: List[Dict]):
+        """Write a batch of feedback events (runs on the feedback writer thread, the only writer)"""
+        try:
+            # Score updates are read-modify-write; applying them in arrival order on this one
+            # thread keeps updates to the same story from interleaving
+            for event in events:
+                # 🎯 UPDATE ORIGINAL STORY QUALITY SCORE
+                self._update_story_quality_score(event['story_id'], event['quality_score'],
+                                                 event['feedback_data']['feedback_date'])
+                
+                # 🔄 IF HIGH-QUALITY IMPROVED TEST CASES PROVIDED, ADD AS NEW EXAMPLES
+                if event['improved_testcases'] and event['quality_score'] >= 4.0:
+                    self._add_improved_examples_to_knowledge_base(event['story_id'], event['improved_testcases'],
+                                                                  event['now'])
+                
+                # 📈 UPDATE DOMAIN-SPECIFIC QUALITY METRICS
+                self._update_domain_quality_metrics(event['story_id'], event['quality_score'],
+                                                    event['feedback_categories'])
             
-            # 📈 UPDATE DOMAIN-SPECIFIC QUALITY METRICS
-            self._update_domain_quality_metrics(story_id, testcase_quality_score, feedback_categories)
+            # 💾 STORE IN FEEDBACK COLLECTION: it is only ever read by get()/count(), never searched
+            # by similarity, so rows carry placeholder vectors instead of a model forward pass
+            # (omitting embeddings would make Chroma run its own default embedding function)
+            feedback_texts = [event['feedback_text'] for event in events]
+            self.feedback_collection.add(
+                documents=feedback_texts,
+                embeddings=_chroma_embeddings(np.zeros((len(events), self._embedding_dim), dtype=np.float32)),
+                metadatas=[event['feedback_data'] for event in events],
+                ids=[f"feedback_{event['story_id']}_{event['now'].timestamp()}" for event in events]
+            )
             
-            logger.info(f"✅ Enhanced feedback processed for story: {story_id} (Score: {testcase_quality_score})")
+            logger.info(f"✅ Enhanced feedback processed for {len(events)} event(s): "
+                        f"{', '.join(event['story_id'] for event in events[:5])}")
             
         except Exception as e:
             logger.error(f"Failed to add enhanced feedback: {e}")
     
-    def _update_story_quality_score(self, story_id: str, new_score: float):
+    def _get_stories_by_id(self, ids: List[str], include_embeddings: bool = False) -> Dict:
+        """
+        Look stories up by Chroma id: from the in-memory mirror when loaded, else by primary key
+        
+        Args:
+            ids: Chroma ids to fetch
+            include_embeddings: Also return the stored vectors (unit-normalized when from the mirror;
+                equivalent under cosine distance)
+        """
+        with self._index_lock:
+            # PQ reconstructions are approximate; exact vectors come from Chroma
+            if self._index_codes is not None and not (include_embeddings and self._index_pq is not None):
+                rows = [self._index_rows[story_id] for story_id in ids if story_id in self._index_rows]
+                results = {
+                    'ids': [self._index_ids[row] for row in rows],
+                    'documents': [self._index_documents[row] for row in rows],
+                    'metadatas': [self._index_metadatas[row] for row in rows]
+                }
+                if include_embeddings:
+                    results['embeddings'] = [self._index_vectors[row] for row in rows]
+                return results
+        
+        include = ['documents', 'metadatas', 'embeddings'] if include_embeddings else ['documents', 'metadatas']
+        return self.collection.get(ids=ids, include=include)
+    
+    def _update_story_quality_score(self, story_id: str, new_score: float, feedback_date: Optional[str] = None):
         """Update the quality score of the original story in the main collection"""
         try:
-            # Get the original story
-            results = self.collection.get(
-                where={"story_id": story_id}
-            )
+            # Get the original story (by id - no metadata scan)
+            results = self._get_stories_by_id([story_id])
             
             if results and results['documents']:
                 # Update metadata with new feedback score
@@ -253,13 +936,14 @@ class EnhancedRAGHelper:
                     updated_metadata = {**current_metadata}
                     updated_metadata['feedback_score'] = round(updated_score, 2)
                     updated_metadata['feedback_count'] = feedback_count + 1
-                    updated_metadata['last_feedback'] = datetime.now().isoformat()
+                    updated_metadata['last_feedback'] = feedback_date or datetime.now().isoformat()
                     
                     # Update in collection
                     self.collection.update(
                         ids=[id],
                         metadatas=[updated_metadata]
                     )
+                    self._index_update_metadata(id, updated_metadata)
                     
                 logger.info(f"📊 Updated story quality score: {story_id} -> {updated_score:.2f}")
                 
@@ -271,26 +955,21 @@ class EnhancedRAGHelper:
         if not feedback_text:
             return {"sentiment": "neutral", "key_issues": [], "suggestions": []}
         
-        feedback_lower = feedback_text.lower()
-        
-        # 🎯 IDENTIFY COMMON FEEDBACK PATTERNS
-        quality_indicators = {
-            "positive": ["good", "great", "excellent", "comprehensive", "thorough", "detailed"],
-            "negative": ["poor", "bad", "incomplete", "missing", "lacking", "insufficient"],
-            "suggestions": ["should", "could", "need", "add", "include", "consider", "improve"]
-        }
+        # Lowercase and strip punctuation in C so "good," and "missing." still match
+        words = feedback_text.lower().translate(_STRIP_PUNCTUATION).split()
         
         sentiment_score = 0
         key_issues = []
         suggestions = []
         
-        for word in feedback_lower.split():
-            if word in quality_indicators["positive"]:
+        # 🎯 IDENTIFY COMMON FEEDBACK PATTERNS
+        for word in words:
+            if word in _POSITIVE_WORDS:
                 sentiment_score += 1
-            elif word in quality_indicators["negative"]:
+            elif word in _NEGATIVE_WORDS:
                 sentiment_score -= 1
                 key_issues.append(word)
-            elif word in quality_indicators["suggestions"]:
+            elif word in _SUGGESTION_WORDS:
                 suggestions.append(word)
         
         sentiment = "positive" if sentiment_score > 0 else "negative" if sentiment_score < 0 else "neutral"
@@ -335,11 +1014,13 @@ class EnhancedRAGHelper:
         
         return " | ".join(parts)
     
-    def _add_improved_examples_to_knowledge_base(self, original_story_id: str, improved_testcases: List[Dict]):
+    def _add_improved_examples_to_knowledge_base(self, original_story_id: str, improved_testcases: List[Dict],
+                                                 now: Optional[datetime] = None):
         """Add user-improved test cases as high-quality examples"""
+        now = now or datetime.now()
         try:
-            # Get the original story
-            results = self.collection.get(where={"story_id": original_story_id})
+            # Get the original story and its stored vector (by id - no metadata scan)
+            results = self._get_stories_by_id([original_story_id], include_embeddings=True)
             
             if results and results['documents']:
                 original_story = results['documents'][0]
@@ -348,21 +1029,24 @@ class EnhancedRAGHelper:
                 # Create new entry with improved test cases
                 improved_metadata = {**original_metadata}
                 improved_metadata.update({
-                    "testCases": json.dumps(improved_testcases),
+                    **_testcases_metadata(improved_testcases),
                     "source": "user_improved",
                     "feedback_score": 5.0,  # User-improved examples are high quality
                     "original_story_id": original_story_id,
-                    "improvement_date": datetime.now().isoformat()
+                    "improvement_date": now.isoformat()
                 })
                 
-                embedding = self.model.encode(original_story).tolist()
+                # Same text as the original, so reuse its vector instead of re-encoding
+                embedding = np.asarray(results['embeddings'][:1], dtype=np.float32)
+                improved_id = f"improved_{original_story_id}_{now.timestamp()}"
                 
                 self.collection.add(
                     documents=[original_story],
-                    embeddings=[embedding],
+                    embeddings=_chroma_embeddings(embedding),
                     metadatas=[improved_metadata],
-                    ids=[f"improved_{original_story_id}_{datetime.now().timestamp()}"]
+                    ids=[improved_id]
                 )
+                self._index_add([improved_id], embedding, [improved_metadata], [original_story])
                 
                 logger.info(f"📚 Added user-improved examples for story: {original_story_id}")
                 
@@ -380,107 +1064,81 @@ class EnhancedRAGHelper:
     
     def _generate_story_id(self, story: str) -> str:
         """Generate unique ID for a story"""
-        return f"story_{hashlib.md5(story.encode()).hexdigest()[:8]}"
+        # Persisted as the Chroma id: must stay MD5 so existing stories keep their ids.
+        # Not a security use, so FIPS-mode OpenSSL builds still allow it.
+        return f"story_{hashlib.md5(story.encode(), **_MD5_NOT_FOR_SECURITY).hexdigest()[:8]}"
     
     def _extract_domain(self, story: str) -> str:
         """Extract domain/category from user story"""
-        story_lower = story.lower()
-        
-        domain_keywords = {
-            'ecommerce': ['cart', 'product', 'checkout', 'order', 'purchase', 'shop', 'inventory'],
-            'authentication': ['login', 'password', 'user', 'account', 'register', 'auth'],
-            'finance': ['payment', 'transaction', 'billing', 'invoice', 'money', 'credit'],
-            'social': ['post', 'comment', 'like', 'share', 'follow', 'message'],
-            'search': ['search', 'filter', 'sort', 'query', 'results'],
-            'mobile': ['mobile', 'app', 'swipe', 'touch', 'notification'],
-            'ui_ux': ['click', 'button', 'form', 'page', 'navigate', 'interface']
-        }
-        
-        for domain, keywords in domain_keywords.items():
-            if any(keyword in story_lower for keyword in keywords):
-                return domain
-        
-        return 'general'
+        return _analyze_story(story)[0]
     
     def _extract_keywords(self, story: str) -> List[str]:
         """Extract relevant keywords from story"""
-        import re
-        
         # Simple keyword extraction (can be enhanced with NLP)
-        words = re.findall(r'\b\w+\b', story.lower())
-        
-        # Filter out common stop words
-        stop_words = {'i', 'want', 'to', 'so', 'that', 'as', 'a', 'an', 'the', 'and', 'or', 'but'}
-        keywords = [word for word in words if word not in stop_words and len(word) > 2]
-        
-        # Return most frequent keywords
-        from collections import Counter
-        return [word for word, _ in Counter(keywords).most_common(10)]
+        return list(_analyze_story(story)[1])
     
     def _calculate_complexity_score(self, story: str) -> float:
         """Calculate story complexity for better matching"""
-        # Simple complexity scoring based on length and specific indicators
-        word_count = len(story.split())
-        
-        complexity_indicators = ['integrate', 'multiple', 'complex', 'advanced', 'system']
-        complexity_bonus = sum(1 for indicator in complexity_indicators if indicator in story.lower())
-        
-        return min(1.0, (word_count / 100) + (complexity_bonus * 0.2))
+        return _analyze_story(story)[2]
     
-    def _calculate_relevance_score(self, query_story: str, candidate_story: str, 
-                                 metadata: Dict, distance: float, query_domain: str, 
-                                 query_keywords: List[str]) -> float:
+    def _calculate_relevance_scores(self, metadatas: List[Dict], distances: List[float],
+                                    query_domain: str, query_keywords: frozenset) -> np.ndarray:
         """
-        🚀 ENHANCED relevance scoring with improved feedback integration
+        🚀 ENHANCED relevance scoring with improved feedback integration, vectorized over candidates
+        
+        Args:
+            metadatas: Candidate metadata dicts
+            distances: Cosine distance of each candidate to the query
+            query_domain: Domain of the query story
+            query_keywords: Keyword set of the query story
+            
+        Returns:
+            Relevance score per candidate (0-1)
         """
+        feedback_scores = np.array([m.get('feedback_score', 3.0) for m in metadatas], dtype=np.float64)  # Default to 3.0 instead of 0.5
+        feedback_counts = np.array([m.get('feedback_count', 0) for m in metadatas], dtype=np.float64)
+        domain_match = np.array([m.get('domain', 'general') == query_domain for m in metadatas], dtype=bool)
+        # Candidates whose signature shares no bit with the query's can't overlap: skip the set work
+        query_bits = _keyword_bits(query_keywords)
+        keyword_overlap = np.array([
+            len(query_keywords & _keyword_set(m.get('keywords', ''))) if query_bits & m.get('kw_bits', -1) else 0
+            for m in metadatas
+        ], dtype=np.float64)
+        sources = [m.get('source', 'sample') for m in metadatas]
+        is_generated = np.array([source == 'generated' for source in sources], dtype=bool)
+        is_improved = np.array([source == 'user_improved' for source in sources], dtype=bool)
+        
         # 🎯 Base semantic similarity (35% weight - reduced to make room for quality)
-        semantic_score = max(0, 1 - distance) * 0.35
+        semantic_score = np.maximum(0.0, 1.0 - np.asarray(distances, dtype=np.float64)) * 0.35
         
         # 🏢 Domain matching bonus (25% weight)
-        candidate_domain = metadata.get('domain', 'general')
-        domain_score = 0.25 if query_domain == candidate_domain else 0.05
+        domain_score = np.where(domain_match, 0.25, 0.05)
         
         # 🔤 Keyword overlap bonus (15% weight)
-        candidate_keywords_str = metadata.get('keywords', '')
-        candidate_keywords = candidate_keywords_str.split(',') if candidate_keywords_str else []
-        keyword_overlap = len(set(query_keywords) & set(candidate_keywords))
-        keyword_score = min(0.15, keyword_overlap * 0.03)
+        keyword_score = np.minimum(0.15, keyword_overlap * 0.03)
         
         # 🌟 ENHANCED Quality scoring from feedback (20% weight - INCREASED!)
-        feedback_score = metadata.get('feedback_score', 3.0)  # Default to 3.0 instead of 0.5
-        feedback_count = metadata.get('feedback_count', 0)
-        
-        # Quality bonus with confidence factor
-        if feedback_count >= 3:  # High confidence
-            quality_score = ((feedback_score - 3.0) / 2.0) * 0.20  # -0.20 to +0.20
-        elif feedback_count >= 1:  # Medium confidence
-            quality_score = ((feedback_score - 3.0) / 2.0) * 0.15  # -0.15 to +0.15
-        else:  # Low confidence - use default
-            quality_score = 0.05
+        # High confidence (3+ ratings): -0.20 to +0.20, medium (1-2): -0.15 to +0.15, else default
+        normalized_feedback = (feedback_scores - 3.0) / 2.0
+        quality_score = np.where(feedback_counts >= 3, normalized_feedback * 0.20,
+                                 np.where(feedback_counts >= 1, normalized_feedback * 0.15, 0.05))
         
         # 📈 User-improved examples get priority boost
-        if metadata.get('source') == 'user_improved':
-            quality_score += 0.10
-        
-        # ⏰ Recency bonus (5% weight)
-        source = metadata.get('source', 'sample')
-        if source == 'generated':
-            recency_score = 0.05
-        elif source == 'user_improved':
-            recency_score = 0.03  # Slightly less than generated but still recent
-        else:
-            recency_score = 0.01
+        quality_score += np.where(is_improved, 0.10, 0.0)
+        
+        # ⏰ Recency bonus (5% weight): user-improved slightly less than generated but still recent
+        recency_score = np.where(is_generated, 0.05, np.where(is_improved, 0.03, 0.01))
         
         # 🎯 Calculate total score
         total_score = semantic_score + domain_score + keyword_score + quality_score + recency_score
         
-        # 🚀 Apply additional boosts for exceptional cases
-        if feedback_score >= 4.5 and feedback_count >= 2:
-            total_score *= 1.1  # 10% boost for consistently high-rated examples
-        elif feedback_score <= 2.0 and feedback_count >= 2:
-            total_score *= 0.8  # 20% penalty for consistently low-rated examples
+        # 🚀 Apply additional boosts for exceptional cases: 10% for consistently high-rated
+        # examples, 20% penalty for consistently low-rated ones
+        rated = feedback_counts >= 2
+        total_score *= np.where(rated & (feedback_scores >= 4.5), 1.1,
+                                np.where(rated & (feedback_scores <= 2.0), 0.8, 1.0))
         
-        return min(1.0, total_score)
+        return np.minimum(1.0, total_score)
     
     def _generate_domain_specific_edge_cases(self, domain: str, story: str) -> List[Dict]:
         """Generate domain-specific edge cases for better coverage"""
@@ -558,7 +1216,8 @@ class EnhancedRAGHelper:
             return {
                 "total_stories_learned": total_stories,
                 "total_feedback_received": total_feedback,
-                "embedding_model": "all-mpnet-base-v2",
+                "embedding_backend": self.embedding_backend,
+                "embedding_model": self.embedding_model_name,
                 "last_updated": datetime.now().isoformat(),
                 "feedback_quality_distribution": feedback_quality_dist,
                 "domain_performance": domain_stats,
@@ -601,27 +1260,24 @@ class EnhancedRAGHelper:
             if not story_results['metadatas']:
                 return {}
             
-            domain_stats = {}
+            metadatas = story_results['metadatas']
+            domains = np.array([metadata.get('domain', 'general') for metadata in metadatas])
+            feedback_scores = np.array([metadata.get('feedback_score', 3.0) for metadata in metadatas], dtype=np.float64)
+            feedback_counts = np.array([metadata.get('feedback_count', 0) for metadata in metadatas], dtype=np.int64)
             
-            for metadata in story_results['metadatas']:
-                domain = metadata.get('domain', 'general')
-                feedback_score = metadata.get('feedback_score', 3.0)
-                feedback_count = metadata.get('feedback_count', 0)
-                
-                if domain not in domain_stats:
-                    domain_stats[domain] = {
-                        "story_count": 0,
-                        "avg_quality": 0,
-                        "total_feedback": 0
-                    }
-                
-                domain_stats[domain]["story_count"] += 1
-                domain_stats[domain]["total_feedback"] += feedback_count
-                
-                # Calculate weighted average
-                current_avg = domain_stats[domain]["avg_quality"]
-                story_count = domain_stats[domain]["story_count"]
-                domain_stats[domain]["avg_quality"] = (current_avg * (story_count - 1) + feedback_score) / story_count
+            # Group by domain in C: counts, score sums and feedback totals per group
+            unique_domains, first_seen, group = np.unique(domains, return_index=True, return_inverse=True)
+            story_counts = np.bincount(group)
+            score_sums = np.bincount(group, weights=feedback_scores)
+            feedback_totals = np.bincount(group, weights=feedback_counts)
+            
+            domain_stats = {}
+            for g in np.argsort(first_seen):  # Domains in order of first appearance
+                domain_stats[str(unique_domains[g])] = {
+                    "story_count": int(story_counts[g]),
+                    "avg_quality": float(score_sums[g] / story_counts[g]),
+                    "total_feedback": int(feedback_totals[g])
+                }
             
             return domain_stats
         except Exception as e:
@@ -636,29 +1292,24 @@ class EnhancedRAGHelper:
             if not feedback_results['metadatas']:
                 return {"trend": "insufficient_data", "recent_avg": 3.0, "older_avg": 3.0}
             
-            # Sort feedback by date
-            feedback_with_dates = []
-            for i, metadata in enumerate(feedback_results['metadatas']):
-                try:
-                    date_str = metadata.get('feedback_date', datetime.now().isoformat())
-                    date_obj = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-                    quality_score = float(metadata.get('quality_score', 3.0))
-                    feedback_with_dates.append((date_obj, quality_score))
-                except:
-                    continue
-            
-            if len(feedback_with_dates) < 2:
-                return {"trend": "insufficient_data", "recent_avg": 3.0, "older_avg": 3.0}
+            metadatas = feedback_results['metadatas']
+            timestamps = [metadata.get('feedback_date_ts') for metadata in metadatas]
             
-            feedback_with_dates.sort(key=lambda x: x[0])
+            if all(isinstance(ts, (int, float)) for ts in timestamps):
+                # Epoch seconds stored at write time: no date parsing at all
+                dates = np.array(timestamps, dtype=np.float64)
+                scores = np.array([metadata.get('quality_score', 3.0) for metadata in metadatas], dtype=np.float64)
+            else:
+                dates, scores = self._parse_feedback_dates(metadatas)
             
-            # Split into older and recent halves
-            mid_point = len(feedback_with_dates) // 2
-            older_scores = [score for _, score in feedback_with_dates[:mid_point]]
-            recent_scores = [score for _, score in feedback_with_dates[mid_point:]]
+            if len(scores) < 2:
+                return {"trend": "insufficient_data", "recent_avg": 3.0, "older_avg": 3.0}
             
-            older_avg = sum(older_scores) / len(older_scores) if older_scores else 3.0
-            recent_avg = sum(recent_scores) / len(recent_scores) if recent_scores else 3.0
+            # Split into older and recent halves by date (a partition, no full sort needed)
+            mid_point = len(scores) // 2
+            order = np.argpartition(dates, mid_point)
+            older_avg = float(scores[order[:mid_point]].mean())
+            recent_avg = float(scores[order[mid_point:]].mean())
             
             trend = "improving" if recent_avg > older_avg + 0.1 else "declining" if recent_avg < older_avg - 0.1 else "stable"
             
@@ -672,19 +1323,42 @@ class EnhancedRAGHelper:
             logger.error(f"Error getting improvement trends: {e}")
             return {"trend": "error", "recent_avg": 3.0, "older_avg": 3.0}
     
+    def _parse_feedback_dates(self, metadatas: List[Dict]):
+        """(dates, scores) arrays from ISO 'feedback_date' strings, for feedback stored without a timestamp"""
+        now_iso = datetime.now().isoformat()
+        try:
+            # Vectorized ISO-8601 parse; timezone-suffixed or malformed dates take the slow path
+            dates = np.array([metadata.get('feedback_date', now_iso) for metadata in metadatas],
+                             dtype='datetime64[us]').astype(np.float64)
+            scores = np.array([metadata.get('quality_score', 3.0) for metadata in metadatas], dtype=np.float64)
+        except (ValueError, TypeError):
+            parsed = []
+            for metadata in metadatas:
+                try:
+                    date_str = metadata.get('feedback_date', now_iso)
+                    date_obj = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+                    parsed.append((date_obj.timestamp(), float(metadata.get('quality_score', 3.0))))
+                except:
+                    continue
+            dates = np.array([date for date, _ in parsed], dtype=np.float64)
+            scores = np.array([score for _, score in parsed], dtype=np.float64)
+        
+        return dates, scores
+    
     def _calculate_learning_effectiveness(self) -> float:
         """Calculate how effectively the system is learning"""
         try:
-            story_results = self.collection.get()
-            
-            if not story_results['metadatas']:
+            total_stories = self.collection.count()
+            if total_stories == 0:
                 return 0.5
             
-            high_quality_stories = sum(1 for metadata in story_results['metadatas'] 
-                                     if metadata.get('feedback_score', 3.0) >= 4.0)
-            total_stories = len(story_results['metadatas'])
+            # count() takes no filter; an ids-only get keeps the filtering in Chroma's sqlite layer
+            high_quality_stories = len(self.collection.get(
+                where={"feedback_score": {"$gte": 4.0}},
+                include=[]
+            )['ids'])
             
-            return round(high_quality_stories / total_stories if total_stories > 0 else 0.5, 2)
+            return round(high_quality_stories / total_stories, 2)
         except:
             return 0.5
     
@@ -701,5 +1375,23 @@ class EnhancedRAGHelper:
         except:
             return 0.0
 
-# Global instance
-rag_helper = EnhancedRAGHelper()
\ No newline at end of file
+# Shared instance, created on first use: loading the model and opening Chroma takes seconds
+_rag_helper = None
+_rag_helper_lock = threading.Lock()
+
+def get_rag_helper() -> EnhancedRAGHelper:
+    """Return the process-wide EnhancedRAGHelper, creating it on first call"""
+    global _rag_helper
+    if _rag_helper is None:
+        with _rag_helper_lock:
+            if _rag_helper is None:
+                _rag_helper = EnhancedRAGHelper()
+                # Registered once, for the shared instance only: short-lived helpers close their own writer
+                atexit.register(_rag_helper._close_feedback_writer)
+    return _rag_helper
+
+def __getattr__(name: str):
+    # Keeps `from enhanced_rag_helper import rag_helper` working, now lazily
+    if name == 'rag_helper':
+        return get_rag_helper()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -1,15 +1,127 @@
 # figma_integration.py
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import importlib.util
 import json
 import os
-from typing import Dict, List, Any, Optional, Tuple
+import re
+import sys
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple, Union
+from urllib.parse import urlencode
 from dataclasses import dataclass
 from datetime import datetime
 import base64
 import tempfile
 
-@dataclass
+# Optional: C JSON parser for (potentially multi-MB) Figma document responses
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Optional: streaming JSON parser, so component extraction never holds a whole document tree
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+# Optional: Aho-Corasick automaton for single-pass component name classification
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Figma URL pattern: web (file|design) URLs or figma:// links
+_FIGMA_URL_RE = re.compile(
+    r'https://www\.figma\.com/(?:file|design)/([a-zA-Z0-9\-_]+)/[^?]*(?:\?[^#]*)?(?:#(.+))?'
+    r'|figma://file/([a-zA-Z0-9\-_]+)(?:#(.+))?'
+)
+
+# Fallback component type by Figma node type
+_FIGMA_TYPE_MAPPING = {
+    'FRAME': 'container',
+    'GROUP': 'group',
+    'TEXT': 'text',
+    'RECTANGLE': 'shape',
+    'ELLIPSE': 'shape',
+    'VECTOR': 'icon',
+    'INSTANCE': 'component'
+}
+
+def _response_json(response) -> Any:
+    """Decode a requests response body as JSON (orjson parses the raw bytes directly)"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(response.content)
+    return response.json()
+
+# Description template per component type
+_COMPONENT_DESCRIPTIONS = {
+    'button': "Interactive button element '{name}' that users can click",
+    'input': "Input field '{name}' where users can enter text",
+    'dropdown': "Dropdown menu '{name}' for selecting options",
+    'checkbox': "Checkbox '{name}' for boolean selection",
+    'radio': "Radio button '{name}' for single option selection",
+    'link': "Clickable link '{name}' for navigation",
+    'modal': "Modal dialog '{name}' that appears over main content",
+    'tab': "Tab element '{name}' for content switching",
+    'card': "Card component '{name}' displaying grouped information",
+    'list': "List component '{name}' showing collection of items"
+}
+
+# Default interactions per component type
+_INTERACTION_MAP = {
+    'button': ('click', 'tap', 'press'),
+    'input': ('type', 'enter text', 'focus', 'blur'),
+    'dropdown': ('click', 'select option', 'expand', 'collapse'),
+    'checkbox': ('check', 'uncheck', 'toggle'),
+    'radio': ('select', 'choose option'),
+    'link': ('click', 'navigate'),
+    'modal': ('open', 'close', 'dismiss'),
+    'tab': ('click', 'switch', 'activate'),
+    'card': ('click', 'view details'),
+    'list': ('scroll', 'select item', 'browse')
+}
+
+# Node types that never map to a testable UI element; their subtrees are not visited
+_SKIP_NODE_TYPES = frozenset({'SLICE', 'BOOLEAN_OPERATION'})
+
+# Deepest layer nesting visited during extraction (0 = unlimited)
+FIGMA_MAX_NODE_DEPTH = int(os.getenv('FIGMA_MAX_NODE_DEPTH', '0'))
+
+# Distinct (layer name, node type) classifications remembered per FigmaIntegration
+COMPONENT_TYPE_CACHE_SIZE = 8192
+
+# Node ids per GET /files/:key/nodes request (keeps batched URLs well under length limits)
+FIGMA_NODE_IDS_PER_REQUEST = 50
+
+# Raw JSON bytes of Figma responses kept for If-None-Match revalidation (decoded objects take a few
+# times more); least recently used responses are evicted past it, larger ones are never kept
+FIGMA_RESPONSE_CACHE_MAX_BYTES = 8 * 1024 * 1024
+
+# Background fetches per FigmaIntegration (one image analysis and one components fetch per
+# in-flight request, so a few concurrent requests share the pool without queuing)
+FIGMA_FETCH_WORKERS = 4
+
+# Extracted component lists kept per (file, node, version)
+FIGMA_COMPONENTS_CACHE_SIZE = 32
+
+# Figma JSON compresses very well; advertise Brotli only when urllib3 can decode it
+BROTLI_AVAILABLE = any(importlib.util.find_spec(name) is not None for name in ("brotli", "brotlicffi"))
+FIGMA_ACCEPT_ENCODING = "br, gzip, deflate" if BROTLI_AVAILABLE else "gzip, deflate"
+
+# Slotted dataclasses (no per-instance __dict__) where supported; Python 3.8/3.9 keep plain ones
+_DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(**_DATACLASS_SLOTS)
 class FigmaNode:
     """Represents a Figma design node"""
     id: str
@@ -25,7 +137,7 @@ class FigmaNode:
         if self.properties is None:
             self.properties = {}
 
-@dataclass
+@dataclass(**_DATACLASS_SLOTS)
 class FigmaComponent:
     """Represents a UI component extracted from Figma"""
     name: str
@@ -50,9 +162,28 @@ class FigmaIntegration:
         self.base_url = "https://api.figma.com/v1"
         self.headers = {
             'X-Figma-Token': self.access_token,
-            'Content-Type': 'application/json'
+            'Content-Type': 'application/json',
+            'Accept-Encoding': FIGMA_ACCEPT_ENCODING
         }
         
+        # One keep-alive session for all Figma calls: the TCP/TLS handshake is paid once per host,
+        # and transient gateway errors / rate limits are retried with backoff
+        self._session = requests.Session()
+        self._session.headers.update(self.headers)
+        retry = Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 502, 503, 504),
+                      allowed_methods=frozenset({'GET'}), raise_on_status=False)
+        self._session.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retry))
+        
+        # Runs the second of two side-by-side fetches (the calling thread runs the first): the
+        # components fetch in _fetch_design_data and the image analysis alongside the basic context
+        self._fetch_executor = ThreadPoolExecutor(max_workers=FIGMA_FETCH_WORKERS, thread_name_prefix='figma-fetch')
+        
+        # LRU caches: url -> (etag, decoded JSON, body bytes), and (file_key, node_id, version) -> components
+        self._response_cache = OrderedDict()
+        self._response_cache_bytes = 0
+        self._components_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        
         # UI component patterns for test case generation
         self.ui_component_patterns = {
             'button': ['button', 'btn', 'cta', 'submit', 'click'],
@@ -66,6 +197,22 @@ class FigmaIntegration:
             'card': ['card', 'item', 'tile'],
             'list': ['list', 'table', 'grid', 'collection']
         }
+        self._pattern_automaton = self._build_pattern_automaton() if AHOCORASICK_AVAILABLE else None
+        self._component_type_cache = {}
+    
+    def _build_pattern_automaton(self):
+        """
+        Compile every component name pattern into one automaton, tagged with its type's priority
+        """
+        automaton = ahocorasick.Automaton()
+        for priority, (component_type, patterns) in enumerate(self.ui_component_patterns.items()):
+            for pattern in patterns:
+                # A pattern listed under two types keeps the higher-priority (earlier) one
+                existing = automaton.get(pattern, None)
+                if existing is None or existing[0] > priority:
+                    automaton.add_word(pattern, (priority, component_type))
+        automaton.make_automaton()
+        return automaton
     
     def validate_figma_url(self, figma_url: str) -> Tuple[bool, str, str]:
         """
@@ -74,23 +221,14 @@ class FigmaIntegration:
         Returns:
             Tuple of (is_valid, file_key, node_id)
         """
-        import re
-        
-        # Figma URL patterns
-        patterns = [
-            r'https://www\.figma\.com/file/([a-zA-Z0-9\-_]+)/[^?]*(?:\?[^#]*)?(?:#(.+))?',
-            r'https://www\.figma\.com/design/([a-zA-Z0-9\-_]+)/[^?]*(?:\?[^#]*)?(?:#(.+))?',
-            r'figma://file/([a-zA-Z0-9\-_]+)(?:#(.+))?'
-        ]
-        
-        for pattern in patterns:
-            match = re.match(pattern, figma_url)
-            if match:
-                file_key = match.group(1)
-                node_id = match.group(2) if match.group(2) else None
-                return True, file_key, node_id
+        match = _FIGMA_URL_RE.match(figma_url)
+        if not match:
+            return False, "", ""
         
-        return False, "", ""
+        # Groups 1/2 come from web URLs, 3/4 from figma:// links
+        file_key = match.group(1) or match.group(3)
+        node_id = match.group(2) or match.group(4) or None
+        return True, file_key, node_id
     
     def validate_figma_file_access(self, file_key: str) -> Tuple[bool, str]:
         """
@@ -101,20 +239,19 @@ class FigmaIntegration:
         """
         try:
             url = f"{self.base_url}/files/{file_key}"
-            response = requests.get(url, headers=self.headers, timeout=10)
+            data = self._get_json(url, timeout=10)
             
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('err'):
-                    return False, f"Figma API error: {data['err']}"
-                return True, "File is accessible"
-            elif response.status_code == 403:
+            if data.get('err'):
+                return False, f"Figma API error: {data['err']}"
+            return True, "File is accessible"
+            
+        except requests.HTTPError as e:
+            if e.response.status_code == 403:
                 return False, "Access denied - check if your token has permission to access this file"
-            elif response.status_code == 404:
+            elif e.response.status_code == 404:
                 return False, "File not found - check if the file ID is correct"
             else:
-                return False, f"HTTP {response.status_code}: {response.text}"
-                
+                return False, f"HTTP {e.response.status_code}: {e.response.text}"
         except Exception as e:
             return False, f"Network error: {str(e)}"
     
@@ -124,111 +261,391 @@ class FigmaIntegration:
         """
         try:
             url = f"{self.base_url}/files/{file_key}"
-            response = requests.get(url, headers=self.headers, timeout=30)
-            response.raise_for_status()
-            
-            data = response.json()
-            return {
-                'name': data.get('name', 'Unknown'),
-                'lastModified': data.get('lastModified', ''),
-                'version': data.get('version', ''),
-                'thumbnailUrl': data.get('thumbnailUrl', ''),
-                'document': data.get('document', {})
-            }
+            return self._file_info_from_data(self._get_json(url))
         except Exception as e:
             print(f"❌ Error fetching Figma file info: {e}")
             return {}
     
-    def extract_design_components(self, file_key: str, node_id: str = None) -> List[FigmaComponent]:
+    def _file_info_from_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Basic file information from a GET /files response
+        """
+        return {
+            'name': data.get('name', 'Unknown'),
+            'lastModified': data.get('lastModified', ''),
+            'version': data.get('version', ''),
+            'thumbnailUrl': data.get('thumbnailUrl', ''),
+            'document': data.get('document', {})
+        }
+    
+    def _components_url(self, file_key: str, node_id: str = None) -> str:
+        """
+        URL of the file data that components are extracted from
+        """
+        if node_id:
+            return self._nodes_url(file_key, [node_id])
+        return f"{self.base_url}/files/{file_key}"
+    
+    def _nodes_url(self, file_key: str, node_ids: List[str]) -> str:
+        """
+        GET /files/:key/nodes URL for a batch of node ids
+        """
+        return f"{self.base_url}/files/{file_key}/nodes?{urlencode({'ids': ','.join(node_ids)})}"
+    
+    def _fetch_nodes(self, file_key: str, node_ids: List[str]) -> Dict[str, Any]:
+        """
+        Fetch several nodes with one request per FIGMA_NODE_IDS_PER_REQUEST ids
+        
+        Returns:
+            Mapping of node id to its entry in the response (None for ids Figma couldn't find)
+        """
+        nodes = {}
+        for start in range(0, len(node_ids), FIGMA_NODE_IDS_PER_REQUEST):
+            chunk = node_ids[start:start + FIGMA_NODE_IDS_PER_REQUEST]
+            nodes.update(self._get_json(self._nodes_url(file_key, chunk)).get('nodes') or {})
+        return nodes
+    
+    def extract_design_components(self, file_key: str,
+                                  node_id: Union[str, List[str]] = None) -> List[FigmaComponent]:
         """
         Extract UI components and interactions from Figma file
+        
+        Args:
+            file_key: Figma file key
+            node_id: A node id, or a list of node ids fetched together in batched requests
         """
         try:
-            # Get file data
-            url = f"{self.base_url}/files/{file_key}"
-            if node_id:
-                url += f"?ids={node_id}"
-            
-            response = requests.get(url, headers=self.headers, timeout=30)
-            response.raise_for_status()
+            if isinstance(node_id, (list, tuple)):
+                nodes = self._fetch_nodes(file_key, list(node_id))
+                components = []
+                for requested_id in node_id:
+                    node = nodes.get(requested_id)
+                    if node:
+                        components.extend(self._extract_components_from_node(node['document']))
+                return components
             
-            data = response.json()
-            document = data.get('document', {})
-            
-            # Extract components
-            components = []
-            if node_id:
-                # Extract specific node
-                nodes = data.get('nodes', {})
-                if node_id in nodes:
-                    node_data = nodes[node_id]['document']
-                    components.extend(self._extract_components_from_node(node_data))
-            else:
-                # Extract from entire document
-                components.extend(self._extract_components_from_node(document))
+            # Get file data
+            url = self._components_url(file_key, node_id)
+            if IJSON_AVAILABLE:
+                return self._stream_design_components(url, node_id, file_key)[1]
             
-            return components
+            data = self._get_json(url)
+            return self._components_from_data(data, node_id, file_key)
             
         except Exception as e:
             print(f"❌ Error extracting Figma components: {e}")
             return []
     
-    def _extract_components_from_node(self, node: Dict[str, Any]) -> List[FigmaComponent]:
+    def _components_from_data(self, data: Dict[str, Any], node_id: str = None,
+                              file_key: str = None) -> List[FigmaComponent]:
         """
-        Recursively extract components from a Figma node
+        Extract components from a GET /files response (memoized per file version when file_key is given)
         """
+        version = data.get('version')
+        cache_key = (file_key, node_id, version) if file_key and version else None
+        if cache_key is not None:
+            with self._cache_lock:
+                cached = self._components_cache.get(cache_key)
+                if cached is not None:
+                    self._components_cache.move_to_end(cache_key)
+                    return list(cached)
+        
+        document = data.get('document', {})
+        
+        # Extract components
         components = []
+        if node_id:
+            # Extract specific node
+            node = (data.get('nodes') or {}).get(node_id)
+            if node:
+                components.extend(self._extract_components_from_node(node['document']))
+        else:
+            # Extract from entire document
+            components.extend(self._extract_components_from_node(document))
+        
+        if cache_key is not None:
+            self._cache_put(self._components_cache, cache_key, list(components))
+        return components
+    
+    def _stream_design_components(self, url: str, node_id: str = None,
+                                  file_key: str = None) -> Tuple[Dict[str, Any], List[FigmaComponent]]:
+        """
+        Streamed GET of a components URL; only one top-level subtree is materialized at a time
         
-        node_name = node.get('name', '').lower()
-        node_type = node.get('type', '')
-        
-        # Check if this node represents a UI component
-        component_type = self._identify_component_type(node_name, node_type)
-        if component_type:
-            component = FigmaComponent(
-                name=node.get('name', 'Unnamed'),
-                type=component_type,
-                description=self._generate_component_description(node, component_type),
-                interactions=self._extract_interactions(node, component_type),
-                properties={
-                    'figma_type': node_type,
-                    'visible': node.get('visible', True),
-                    'id': node.get('id', ''),
-                    'bounds': node.get('absoluteBoundingBox', {})
-                }
-            )
-            components.append(component)
+        Streamed bodies are never decoded whole, so they skip the If-None-Match response cache;
+        the extracted components are still memoized per file version.
+        
+        Returns:
+            Tuple of (the response's top-level scalar fields, components in document order)
+        
+        Raises:
+            requests.HTTPError: On a non-2xx response
+        """
+        with self._session.get(url, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            components, fields = self._stream_components(response, node_id)
+        version = fields.get('version')
+        if file_key and version:
+            self._cache_put(self._components_cache, (file_key, node_id, version), list(components))
+        return fields, components
+    
+    def _stream_components(self, response, node_id: str = None) -> Tuple[List[FigmaComponent], Dict[str, Any]]:
+        """
+        Extract components from a streamed GET /files response
+        
+        The root node's own fields and each of its children (pages, or a frame's layers) are
+        built one at a time from parser events, so peak memory is one subtree, not the document.
+        
+        Returns:
+            Tuple of (components in document order, top-level scalar fields such as name and version)
+        """
+        root_prefix = f"nodes.{node_id}.document" if node_id else "document"
+        item_prefix = f"{root_prefix}.children.item"
+        root = {}
+        fields = {}
+        child_components = []
+        field, field_builder = None, None
+        item_builder = None
+        
+        response.raw.decode_content = True
+        for prefix, event, value in ijson.parse(response.raw, use_float=True):
+            if item_builder is not None:
+                item_builder.event(event, value)
+                if prefix == item_prefix and event == 'end_map':
+                    child_components.extend(self._extract_components_from_node(item_builder.value, depth=1))
+                    item_builder = None
+            elif prefix == item_prefix and event == 'start_map':
+                item_builder = ObjectBuilder()
+                item_builder.event(event, value)
+            elif prefix == root_prefix and event in ('map_key', 'end_map'):
+                # A root-level key (or the root's end) completes the previous field
+                if field_builder is not None:
+                    root[field] = field_builder.value
+                    field_builder = None
+                if event == 'map_key' and value != 'children':
+                    field, field_builder = value, ObjectBuilder()
+            elif field_builder is not None:
+                field_builder.event(event, value)
+            elif prefix and '.' not in prefix and event in ('string', 'number', 'boolean', 'null'):
+                # Top-level scalars: name, lastModified, version, thumbnailUrl, ...
+                fields[prefix] = value
+        
+        if not root or self._skip_subtree(root, 0):
+            return [], fields
+        
+        # Pre-order: the root (its children already visited above) comes first
+        return self._extract_components_from_node(root) + child_components, fields
+    
+    def _cache_put(self, cache: OrderedDict, key: Any, value: Any):
+        """
+        Insert into the components LRU, evicting the oldest entry past FIGMA_COMPONENTS_CACHE_SIZE
+        """
+        with self._cache_lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            if len(cache) > FIGMA_COMPONENTS_CACHE_SIZE:
+                cache.popitem(last=False)
+    
+    def _remember_response(self, url: str, etag: str, data: Any, nbytes: int):
+        """
+        Keep a decoded response for revalidation, evicting least recently used ones past
+        FIGMA_RESPONSE_CACHE_MAX_BYTES of body
+        """
+        with self._cache_lock:
+            previous = self._response_cache.pop(url, None)
+            if previous is not None:
+                self._response_cache_bytes -= previous[2]
+            if nbytes > FIGMA_RESPONSE_CACHE_MAX_BYTES:
+                return
+            
+            self._response_cache[url] = (etag, data, nbytes)
+            self._response_cache_bytes += nbytes
+            while self._response_cache_bytes > FIGMA_RESPONSE_CACHE_MAX_BYTES:
+                _, (_, _, evicted_bytes) = self._response_cache.popitem(last=False)
+                self._response_cache_bytes -= evicted_bytes
+    
+    def _revalidation_headers(self, url: str) -> Tuple[Optional[Dict[str, str]], Optional[Any]]:
+        """
+        If-None-Match header and cached body for a previously fetched URL
+        """
+        with self._cache_lock:
+            cached = self._response_cache.get(url)
+        if cached is None:
+            return None, None
+        return {'If-None-Match': cached[0]}, cached[1]
+    
+    def _decode_and_remember(self, url: str, response, cached_data: Any) -> Any:
+        """
+        Body of a (possibly conditional) response: the cached copy on 304, else the decoded JSON
+        """
+        if response.status_code == 304 and cached_data is not None:
+            with self._cache_lock:
+                if url in self._response_cache:
+                    self._response_cache.move_to_end(url)
+            return cached_data
+        
+        response.raise_for_status()
+        data = _response_json(response)
+        etag = response.headers.get('ETag')
+        if etag:
+            self._remember_response(url, etag, data, len(response.content))
+        return data
+    
+    def _get_json(self, url: str, timeout: float = 30) -> Any:
+        """
+        GET a Figma API URL as JSON, revalidating a cached copy with If-None-Match
+        
+        Raises:
+            requests.HTTPError: On a non-2xx response
+        """
+        headers, cached_data = self._revalidation_headers(url)
+        response = self._session.get(url, headers=headers, timeout=timeout)
+        return self._decode_and_remember(url, response, cached_data)
+    
+    def _get_json_or_error(self, url: str) -> Any:
+        """
+        _get_json, returning the exception instead of raising (for fetches run side by side)
+        """
+        try:
+            return self._get_json(url)
+        except Exception as e:
+            return e
+    
+    def _fetch_components_or_error(self, url: str, node_id: str = None,
+                                   file_key: str = None) -> Union[Tuple[Dict[str, Any], List[FigmaComponent]], Exception]:
+        """
+        Response data and components for a components URL, or the exception (for fetches run side by side)
         
-        # Recursively process children
-        children = node.get('children', [])
-        for child in children:
-            components.extend(self._extract_components_from_node(child))
+        Streamed when ijson is installed, so large documents are never held whole; otherwise a
+        revalidated _get_json. With streaming the data holds only the top-level scalar fields.
+        """
+        try:
+            if IJSON_AVAILABLE:
+                return self._stream_design_components(url, node_id, file_key)
+            data = self._get_json(url)
+            return data, self._components_from_data(data, node_id, file_key)
+        except Exception as e:
+            return e
+    
+    def _fetch_design_data(self, file_key: str, node_id: str = None) -> Tuple[Dict[str, Any], List[FigmaComponent]]:
+        """
+        File info and components for a design, fetched concurrently (latency of the slower request)
+        
+        Both requests go through the pooled session, so they reuse its keep-alive connections
+        and its retry/backoff on 429 and gateway errors.
+        """
+        info_url = f"{self.base_url}/files/{file_key}"
+        components_url = self._components_url(file_key, node_id)
+        if components_url == info_url:
+            # Whole-file request: both come from the same response
+            components_result = self._fetch_components_or_error(info_url, node_id, file_key)
+            file_data = components_result if isinstance(components_result, Exception) else components_result[0]
+        else:
+            components_future = self._fetch_executor.submit(self._fetch_components_or_error,
+                                                            components_url, node_id, file_key)
+            file_data = self._get_json_or_error(info_url)
+            components_result = components_future.result()
+        
+        # Same degradation as get_file_info / extract_design_components: a failed fetch yields empty data
+        if isinstance(file_data, Exception):
+            print(f"❌ Error fetching Figma file info: {file_data}")
+            file_info = {}
+        else:
+            file_info = self._file_info_from_data(file_data)
+        
+        if isinstance(components_result, Exception):
+            print(f"❌ Error extracting Figma components: {components_result}")
+            components = []
+        else:
+            components = components_result[1]
+        
+        return file_info, components
+    
+    def _skip_subtree(self, node: Dict[str, Any], depth: int) -> bool:
+        """
+        Whether a node and everything under it can be left out: hidden, zero-area,
+        never-testable types, or nested deeper than FIGMA_MAX_NODE_DEPTH
+        """
+        if node.get('visible', True) is False or node.get('type') in _SKIP_NODE_TYPES:
+            return True
+        if FIGMA_MAX_NODE_DEPTH and depth > FIGMA_MAX_NODE_DEPTH:
+            return True
+        bounds = node.get('absoluteBoundingBox')
+        return bool(bounds) and (bounds.get('width', 1) == 0 or bounds.get('height', 1) == 0)
+    
+    def _extract_components_from_node(self, root: Dict[str, Any], depth: int = 0) -> List[FigmaComponent]:
+        """
+        Extract components from a Figma node and all of its descendants
+        
+        Iterative pre-order traversal (same order as recursion) so deeply nested files
+        can't hit the recursion limit. Hidden and never-testable subtrees are pruned.
+        """
+        components = []
+        stack = [(root, depth)]
+        
+        while stack:
+            node, depth = stack.pop()
+            if self._skip_subtree(node, depth):
+                continue
+            
+            node_name = node.get('name', '').lower()
+            node_type = node.get('type', '')
+            
+            # Check if this node represents a UI component
+            component_type = self._identify_component_type(node_name, node_type)
+            if component_type:
+                component = FigmaComponent(
+                    name=node.get('name', 'Unnamed'),
+                    type=component_type,
+                    description=self._generate_component_description(node, component_type),
+                    interactions=self._extract_interactions(node, component_type),
+                    properties={
+                        'figma_type': node_type,
+                        'visible': node.get('visible', True),
+                        'id': node.get('id', ''),
+                        'bounds': node.get('absoluteBoundingBox', {})
+                    }
+                )
+                components.append(component)
+            
+            # Children are pushed in reverse so they're visited in document order
+            children = node.get('children')
+            if children:
+                stack.extend((child, depth + 1) for child in reversed(children))
         
         return components
     
     def _identify_component_type(self, name: str, figma_type: str) -> Optional[str]:
         """
-        Identify UI component type based on name and Figma type
+        Identify UI component type based on name and Figma type (memoized: layer names repeat a lot)
         """
         name_lower = name.lower()
-        
-        # Check against known patterns
-        for component_type, patterns in self.ui_component_patterns.items():
-            if any(pattern in name_lower for pattern in patterns):
-                return component_type
+        key = (name_lower, figma_type)
+        component_type = self._component_type_cache.get(key)
+        if component_type is None:
+            component_type = self._classify_component(name_lower, figma_type)
+            if len(self._component_type_cache) >= COMPONENT_TYPE_CACHE_SIZE:
+                self._component_type_cache.clear()
+            self._component_type_cache[key] = component_type
+        return component_type
+    
+    def _classify_component(self, name_lower: str, figma_type: str) -> str:
+        """
+        Component type of a lowercased node name, falling back to the Figma node type
+        """
+        # Check against known patterns: the first type (in table order) with any match wins
+        if self._pattern_automaton is not None:
+            hits = (value for _, value in self._pattern_automaton.iter(name_lower))
+            match = min(hits, default=None)
+            if match is not None:
+                return match[1]
+        else:
+            for component_type, patterns in self.ui_component_patterns.items():
+                if any(pattern in name_lower for pattern in patterns):
+                    return component_type
         
         # Fallback based on Figma type
-        figma_type_mapping = {
-            'FRAME': 'container',
-            'GROUP': 'group',
-            'TEXT': 'text',
-            'RECTANGLE': 'shape',
-            'ELLIPSE': 'shape',
-            'VECTOR': 'icon',
-            'INSTANCE': 'component'
-        }
-        
-        return figma_type_mapping.get(figma_type, 'element')
+        return _FIGMA_TYPE_MAPPING.get(figma_type, 'element')
     
     def _generate_component_description(self, node: Dict[str, Any], component_type: str) -> str:
         """
@@ -236,52 +653,25 @@ class FigmaIntegration:
         """
         name = node.get('name', 'Unnamed')
         
-        descriptions = {
-            'button': f"Interactive button element '{name}' that users can click",
-            'input': f"Input field '{name}' where users can enter text",
-            'dropdown': f"Dropdown menu '{name}' for selecting options",
-            'checkbox': f"Checkbox '{name}' for boolean selection",
-            'radio': f"Radio button '{name}' for single option selection",
-            'link': f"Clickable link '{name}' for navigation",
-            'modal': f"Modal dialog '{name}' that appears over main content",
-            'tab': f"Tab element '{name}' for content switching",
-            'card': f"Card component '{name}' displaying grouped information",
-            'list': f"List component '{name}' showing collection of items"
-        }
-        
-        return descriptions.get(component_type, f"UI element '{name}' of type {component_type}")
+        template = _COMPONENT_DESCRIPTIONS.get(component_type)
+        if template is None:
+            return f"UI element '{name}' of type {component_type}"
+        return template.format(name=name)
     
     def _extract_interactions(self, node: Dict[str, Any], component_type: str) -> List[str]:
         """
         Extract possible interactions for a component
         """
-        interactions = []
-        
-        # Default interactions based on component type
-        interaction_map = {
-            'button': ['click', 'tap', 'press'],
-            'input': ['type', 'enter text', 'focus', 'blur'],
-            'dropdown': ['click', 'select option', 'expand', 'collapse'],
-            'checkbox': ['check', 'uncheck', 'toggle'],
-            'radio': ['select', 'choose option'],
-            'link': ['click', 'navigate'],
-            'modal': ['open', 'close', 'dismiss'],
-            'tab': ['click', 'switch', 'activate'],
-            'card': ['click', 'view details'],
-            'list': ['scroll', 'select item', 'browse']
-        }
-        
-        base_interactions = interaction_map.get(component_type, ['interact'])
-        interactions.extend(base_interactions)
+        # Default interactions based on component type; a dict de-duplicates while keeping order
+        interactions = dict.fromkeys(_INTERACTION_MAP.get(component_type, ('interact',)))
         
         # Check for prototyping interactions (if available)
-        prototype_interactions = node.get('prototypeInteractions', [])
-        for interaction in prototype_interactions:
+        for interaction in node.get('prototypeInteractions', ()):
             action = interaction.get('action', {}).get('type', '')
             if action:
-                interactions.append(f"prototype: {action}")
+                interactions[f"prototype: {action}"] = None
         
-        return list(set(interactions))  # Remove duplicates
+        return list(interactions)
     
     def get_design_context_for_story(self, figma_url: str) -> Dict[str, Any]:
         """
@@ -296,11 +686,8 @@ class FigmaIntegration:
             return {'error': 'Figma access token not configured'}
         
         try:
-            # Get file info
-            file_info = self.get_file_info(file_key)
-            
-            # Extract components
-            components = self.extract_design_components(file_key, node_id)
+            # Get file info and extract components (fetched concurrently)
+            file_info, components = self._fetch_design_data(file_key, node_id)
             
             # Generate test-relevant context
             context = {
@@ -316,8 +703,12 @@ class FigmaIntegration:
                 'design_patterns': []
             }
             
-            # Process components for test context
+            # Process components for test context, counting types and generating test scenarios
+            # in the same pass
+            type_counts = Counter()
+            test_scenarios = []
             for component in components:
+                type_counts[component.type] += 1
                 ui_info = {
                     'name': component.name,
                     'type': component.type,
@@ -326,15 +717,22 @@ class FigmaIntegration:
                     'test_considerations': self._generate_test_considerations(component)
                 }
                 context['ui_components'].append(ui_info)
+                test_scenarios.extend(
+                    f"Test {interaction} on {component.name} ({component.type})"
+                    for interaction in component.interactions
+                )
             
-            # Generate user flows based on components
-            context['user_flows'] = self._identify_user_flows(components)
+            # Add cross-component scenarios
+            if len(components) > 1:
+                test_scenarios.append("Test component interactions")
+                test_scenarios.append("Test responsive behavior across components")
+            context['test_scenarios'] = test_scenarios
             
-            # Generate test scenarios
-            context['test_scenarios'] = self._generate_test_scenarios(components)
+            # Generate user flows based on components
+            context['user_flows'] = self._identify_user_flows(type_counts)
             
             # Identify design patterns
-            context['design_patterns'] = self._identify_design_patterns(components)
+            context['design_patterns'] = self._identify_design_patterns(type_counts)
             
             return context
             
@@ -385,71 +783,49 @@ class FigmaIntegration:
         
         return considerations
     
-    def _identify_user_flows(self, components: List[FigmaComponent]) -> List[str]:
+    def _identify_user_flows(self, type_counts: Counter) -> List[str]:
         """
-        Identify potential user flows based on components
+        Identify potential user flows based on component type counts
         """
         flows = []
         
-        component_types = [c.type for c in components]
-        
         # Common flow patterns
-        if 'input' in component_types and 'button' in component_types:
+        if type_counts['input'] and type_counts['button']:
             flows.append('Form submission flow')
         
-        if 'modal' in component_types:
+        if type_counts['modal']:
             flows.append('Modal interaction flow')
         
-        if 'tab' in component_types:
+        if type_counts['tab']:
             flows.append('Tab navigation flow')
         
-        if 'dropdown' in component_types:
+        if type_counts['dropdown']:
             flows.append('Selection and filtering flow')
         
-        if len([c for c in components if c.type == 'button']) > 2:
+        if type_counts['button'] > 2:
             flows.append('Multi-step interaction flow')
         
         return flows
     
-    def _generate_test_scenarios(self, components: List[FigmaComponent]) -> List[str]:
-        """
-        Generate test scenarios based on design components
-        """
-        scenarios = []
-        
-        for component in components:
-            for interaction in component.interactions:
-                scenario = f"Test {interaction} on {component.name} ({component.type})"
-                scenarios.append(scenario)
-        
-        # Add cross-component scenarios
-        if len(components) > 1:
-            scenarios.append("Test component interactions")
-            scenarios.append("Test responsive behavior across components")
-        
-        return scenarios
-    
-    def _identify_design_patterns(self, components: List[FigmaComponent]) -> List[str]:
+    def _identify_design_patterns(self, type_counts: Counter) -> List[str]:
         """
-        Identify design patterns that affect testing
+        Identify design patterns that affect testing, based on component type counts
         """
         patterns = []
         
-        component_types = [c.type for c in components]
-        
-        if 'card' in component_types:
+        if type_counts['card']:
             patterns.append('Card-based layout')
         
-        if 'list' in component_types:
+        if type_counts['list']:
             patterns.append('List/Grid pattern')
         
-        if 'tab' in component_types:
+        if type_counts['tab']:
             patterns.append('Tabbed interface')
         
-        if 'modal' in component_types:
+        if type_counts['modal']:
             patterns.append('Modal/Overlay pattern')
         
-        if len([c for c in components if c.type == 'input']) > 2:
+        if type_counts['input'] > 2:
             patterns.append('Form-heavy interface')
         
         return patterns
@@ -535,32 +911,52 @@ class FigmaIntegration:
 
         return f"Figma: {component_count} UI elements ({most_common}+). Test interactions."
 
+    def _analyze_design_image(self, file_key: str, node_id: str = None) -> Tuple[Any, Any]:
+        """
+        Screenshot analysis for a design
+        
+        Returns:
+            Tuple of (EnhancedFigmaProcessor, FigmaImageAnalysis)
+            
+        Raises:
+            ImportError: If the image processing dependencies aren't installed
+        """
+        from enhanced_figma_processor import EnhancedFigmaProcessor
+        
+        print(f"🎨 Attempting enhanced image analysis for file: {file_key}")
+        processor = EnhancedFigmaProcessor(self.access_token)
+        return processor, processor.analyze_figma_image(file_key, node_id)
+    
     def get_enhanced_design_context_with_images(self, figma_url: str) -> Dict[str, Any]:
         """
         Get enhanced design context including image analysis if available
+        
+        The basic context (/files) and the image analysis (/images + OCR) are independent,
+        so they run concurrently.
         """
-        # Start with basic design context
-        basic_context = self.get_design_context_for_story(figma_url)
+        is_valid, file_key, node_id = self.validate_figma_url(figma_url)
+        if not is_valid or not self.access_token:
+            # Nothing to analyze: the basic context carries the error
+            return self.get_design_context_for_story(figma_url)
+        
+        # The image analysis runs on the shared fetch pool; the basic context runs here, since it
+        # submits its own components fetch to that pool and must not wait on it from a pool thread
+        image_future = self._fetch_executor.submit(self._analyze_design_image, file_key, node_id)
+        try:
+            # Start with basic design context
+            basic_context = self.get_design_context_for_story(figma_url)
+        except BaseException:
+            image_future.cancel()
+            raise
         
         if 'error' in basic_context:
+            # Not needed any more: dropped if still queued, otherwise left to finish on its own
+            image_future.cancel()
             return basic_context
         
         # Try to enhance with image analysis if available
         try:
-            from enhanced_figma_processor import EnhancedFigmaProcessor
-            
-            # Extract file info for image processing
-            is_valid, file_key, node_id = self.validate_figma_url(figma_url)
-            if not is_valid:
-                basic_context['image_analysis'] = {
-                    'error': 'Invalid Figma URL format',
-                    'enhanced_available': False
-                }
-                return basic_context
-            
-            print(f"🎨 Attempting enhanced image analysis for file: {file_key}")
-            processor = EnhancedFigmaProcessor(self.access_token)
-            analysis = processor.analyze_figma_image(file_key, node_id)
+            processor, analysis = image_future.result()
             
             if analysis and analysis.quality_score > 0:
                 # Add image analysis results to context
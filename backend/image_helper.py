@@ -14,18 +14,26 @@ import cv2
 import numpy as np
 import os
 from typing import Dict, List, Any, Optional
+from tesseract_helper import tess_api
+
+# Characters OCR may emit for UI screenshots (same set as the pytesseract config below)
+_OCR_CHAR_WHITELIST = (
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+    ".,!?:;-_()[]{}@#$%^&*+=<>/\\|~`\"' "
+)
+
+# Long edge (px) images are downscaled to before OCR; Tesseract time grows with pixel count
+OCR_MAX_EDGE = 1600
 
 def get_text_from_image(image_path: str) -> Optional[str]:
     """
     Enhanced text extraction from images with better preprocessing
     """
     try:
-        # Load and preprocess image
-        image = Image.open(image_path)
-        
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        # Load and preprocess image: grayscale, capped at OCR_MAX_EDGE on the long edge
+        image = Image.open(image_path).convert('L')
+        if max(image.size) > OCR_MAX_EDGE:
+            image.thumbnail((OCR_MAX_EDGE, OCR_MAX_EDGE), Image.LANCZOS)
         
         # Enhance image for better OCR
         enhancer = ImageEnhance.Contrast(image)
@@ -34,11 +42,22 @@ def get_text_from_image(image_path: str) -> Optional[str]:
         enhancer = ImageEnhance.Sharpness(image)
         image = enhancer.enhance(1.1)
         
+        # Binarize (Otsu picks the threshold per image, so light and dark themes both work)
+        _, binary = cv2.threshold(np.asarray(image), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        image = Image.fromarray(binary)
+        
         # Configure OCR for better accuracy
         ocr_config = r'--oem 3 --psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.,!?:;-_()[]{}@#$%^&*+=<>/\|~`"\'\ '
         
-        # Extract text
-        text = pytesseract.image_to_string(image, config=ocr_config)
+        # Extract text (in-process when tesserocr is installed)
+        # Mirrors the pytesseract config: --oem 3 --psm 6 with a character whitelist
+        with tess_api(psm='SINGLE_BLOCK', oem='DEFAULT',
+                      variables={'tessedit_char_whitelist': _OCR_CHAR_WHITELIST}) as api:
+            if api is not None:
+                api.SetImage(image)
+                text = api.GetUTF8Text()
+        if api is None:
+            text = pytesseract.image_to_string(image, config=ocr_config)
         
         return text.strip() if text else None
         
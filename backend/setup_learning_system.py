@@ -7,7 +7,7 @@ import os
 import sys
 import requests
 import json
-from enhanced_rag_helper import rag_helper
+from enhanced_rag_helper import get_rag_helper
 
 def setup_learning_system():
     """Initialize the learning system with sample data and configurations"""
@@ -15,6 +15,8 @@ def setup_learning_system():
     print("🚀 Setting up Enhanced CaseVector AI Learning System...")
     
     try:
+        rag_helper = get_rag_helper()
+        
         # 1. Initialize RAG helper with sample data
         print("\n📚 Loading sample test cases into vector database...")
         
@@ -84,7 +86,7 @@ def create_minimal_dataset():
     with open('sample_testcases.json', 'w') as f:
         json.dump(minimal_data, f, indent=2)
     
-    rag_helper.ingest_testcases_from_json('sample_testcases.json')
+    get_rag_helper().ingest_testcases_from_json('sample_testcases.json')
     print("✅ Created and loaded minimal dataset")
 
 def test_api_endpoints():
@@ -0,0 +1,79 @@
+"""
+Shared in-process Tesseract (tesserocr) engines
+
+pytesseract starts a tesseract process, which reloads the language data, on every call;
+a PyTessBaseAPI keeps it loaded. tesserocr is optional and can be installed but unusable
+(libtesseract missing, bad tessdata path): the first failure for a configuration is logged
+once, and from then on tess_api() yields None so callers fall through to pytesseract.
+"""
+
+import importlib.util
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+TESSEROCR_AVAILABLE = importlib.util.find_spec('tesserocr') is not None
+
+# Idle engines per configuration. PyTessBaseAPI is not thread-safe, so each use checks one
+# out; concurrent callers get extra engines instead of waiting, and all of them are reused.
+_idle_apis = {}
+_idle_lock = threading.Lock()
+
+# Configurations whose engine failed to load; None in the set means tesserocr itself failed
+_failed = set()
+
+
+def _create_api(key):
+    """New engine for (lang, psm, oem, variables), or None (latched) if tesserocr can't provide one"""
+    lang, psm, oem, variables = key
+    try:
+        from tesserocr import PyTessBaseAPI, PSM, OEM
+    except Exception as e:
+        _failed.add(None)
+        logger.warning(f"tesserocr unusable ({e}), using pytesseract")
+        return None
+
+    try:
+        api = PyTessBaseAPI(lang=lang, psm=getattr(PSM, psm), oem=getattr(OEM, oem))
+        for name, value in variables:
+            api.SetVariable(name, value)
+        return api
+    except Exception as e:
+        _failed.add(key)
+        logger.warning(f"tesserocr could not load lang={lang} psm={psm} oem={oem} ({e}), using pytesseract")
+        return None
+
+
+@contextmanager
+def tess_api(lang: str = 'eng', psm: str = 'AUTO', oem: str = 'DEFAULT',
+             variables: Optional[Dict[str, str]] = None) -> Iterator:
+    """
+    Check out a persistent tesserocr engine for the duration of the block
+
+    Args:
+        lang: Tesseract language(s), e.g. 'eng' or 'eng+hin'
+        psm: tesserocr.PSM member name (page segmentation mode)
+        oem: tesserocr.OEM member name (engine mode)
+        variables: Tesseract variables set once on new engines (e.g. a character whitelist)
+
+    Yields:
+        A PyTessBaseAPI, or None when tesserocr is not installed or failed to load
+    """
+    key = (lang, psm, oem, tuple(sorted((variables or {}).items())))
+    api = None
+    if TESSEROCR_AVAILABLE and None not in _failed and key not in _failed:
+        with _idle_lock:
+            idle = _idle_apis.get(key)
+            api = idle.pop() if idle else None
+        if api is None:
+            api = _create_api(key)
+
+    try:
+        yield api
+    finally:
+        if api is not None:
+            with _idle_lock:
+                _idle_apis.setdefault(key, []).append(api)
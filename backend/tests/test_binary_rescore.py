@@ -0,0 +1,102 @@
+"""
+In-memory retrieval: binary-then-rescore results against brute-force cosine top-k, and index refresh
+
+Run from backend/: python -m unittest discover -s tests
+"""
+
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RAG_DEPS_AVAILABLE = all(importlib.util.find_spec(name) is not None
+                         for name in ('numpy', 'chromadb', 'sentence_transformers', 'torch'))
+
+
+@unittest.skipUnless(RAG_DEPS_AVAILABLE, "chromadb / sentence-transformers not installed")
+class BinaryRescoreTest(unittest.TestCase):
+    dim = 64
+
+    def setUp(self):
+        import numpy as np
+        import enhanced_rag_helper
+        from test_feedback_learning import _HashingModel
+
+        self.module = enhanced_rag_helper
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._original_loader = enhanced_rag_helper._load_embedding_model
+        enhanced_rag_helper._load_embedding_model = _HashingModel
+        self.helper = self._new_helper()
+        self.rng = np.random.default_rng(7)
+
+    def tearDown(self):
+        self.module._load_embedding_model = self._original_loader
+        self.helper._close_feedback_writer()
+        self._tmp_dir.cleanup()
+
+    def _new_helper(self):
+        return self.module.EnhancedRAGHelper(db_path=self._tmp_dir.name, embedding_backend='mpnet')
+
+    def _add_vectors(self, helper, vectors, start: int = 0):
+        ids = [f"story-{start + i}" for i in range(len(vectors))]
+        metadatas = [{'row': start + i} for i in range(len(vectors))]
+        helper._write_stories(ids, vectors, metadatas, [f"story {start + i}" for i in range(len(vectors))])
+
+    def _brute_force(self, vectors, query, k):
+        import numpy as np
+
+        unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        cosine = unit @ (query / np.linalg.norm(query))
+        top = np.argsort(-cosine)[:k]
+        return [int(row) for row in top], [float(1.0 - cosine[row]) for row in top]
+
+    def test_matches_brute_force_when_overcapture_covers_collection(self):
+        import numpy as np
+
+        n_results = 3
+        vectors = self.rng.standard_normal((n_results * self.module.BINARY_OVERCAPTURE, self.dim)).astype(np.float32)
+        self._add_vectors(self.helper, vectors)
+        query = self.rng.standard_normal(self.dim).astype(np.float32)
+
+        results = self.helper._query_binary_then_rescore(query, n_results)
+        expected_rows, expected_distances = self._brute_force(vectors, query, n_results)
+
+        self.assertEqual([metadata['row'] for metadata in results['metadatas'][0]], expected_rows)
+        np.testing.assert_allclose(results['distances'][0], expected_distances, atol=1e-5)
+
+    def test_near_duplicate_query_finds_brute_force_top_hit(self):
+        import numpy as np
+
+        vectors = self.rng.standard_normal((500, self.dim)).astype(np.float32)
+        self._add_vectors(self.helper, vectors)
+
+        for target in (0, 123, 499):
+            query = vectors[target] + 0.05 * self.rng.standard_normal(self.dim).astype(np.float32)
+            results = self.helper._query_binary_then_rescore(query, 5)
+            expected_rows, _ = self._brute_force(vectors, query, 5)
+            self.assertEqual(results['metadatas'][0][0]['row'], expected_rows[0])
+
+    def test_index_picks_up_stories_written_by_another_helper(self):
+        import numpy as np
+
+        vectors = self.rng.standard_normal((4, self.dim)).astype(np.float32)
+        self._add_vectors(self.helper, vectors)
+        self.helper._query_binary_then_rescore(vectors[0], 1)  # Build the mirror
+
+        other = self._new_helper()
+        try:
+            extra = self.rng.standard_normal((1, self.dim)).astype(np.float32)
+            self._add_vectors(other, extra, start=len(vectors))
+        finally:
+            other._close_feedback_writer()
+
+        results = self.helper._query_binary_then_rescore(extra[0], 1)
+        self.assertEqual(results['metadatas'][0][0]['row'], len(vectors))
+        self.assertEqual(len(self.helper._index_ids), len(vectors) + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
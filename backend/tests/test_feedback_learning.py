@@ -0,0 +1,82 @@
+"""
+Feedback learning loop: feedback must reach the stored story's score and the knowledge base
+
+Run from backend/: python -m unittest discover -s tests
+"""
+
+import hashlib
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RAG_DEPS_AVAILABLE = all(importlib.util.find_spec(name) is not None
+                         for name in ('numpy', 'chromadb', 'sentence_transformers', 'torch'))
+
+
+class _HashingModel:
+    """Deterministic stand-in for the sentence model (no download, unit-norm vectors)"""
+    dim = 16
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def _vector(self, text: str):
+        import numpy as np
+
+        seed = int.from_bytes(hashlib.md5(text.encode()).digest()[:4], 'little')
+        vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def encode(self, texts, **kwargs):
+        import numpy as np
+
+        if isinstance(texts, str):
+            return self._vector(texts)
+        return np.stack([self._vector(text) for text in texts])
+
+
+@unittest.skipUnless(RAG_DEPS_AVAILABLE, "chromadb / sentence-transformers not installed")
+class FeedbackLearningTest(unittest.TestCase):
+    def setUp(self):
+        import enhanced_rag_helper
+
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._original_loader = enhanced_rag_helper._load_embedding_model
+        enhanced_rag_helper._load_embedding_model = _HashingModel
+        self.helper = enhanced_rag_helper.EnhancedRAGHelper(db_path=self._tmp_dir.name, embedding_backend='mpnet')
+
+        self.story = "As a user I want to log in with my email and password"
+        self.helper.add_generated_story_context(self.story, [{'id': 'TC-1', 'title': 'Valid login'}])
+        self.story_id = self.helper._generate_story_id(self.story)
+
+    def tearDown(self):
+        import enhanced_rag_helper
+
+        enhanced_rag_helper._load_embedding_model = self._original_loader
+        self.helper._close_feedback_writer()
+        self._tmp_dir.cleanup()
+
+    def test_feedback_updates_story_quality_score(self):
+        self.helper.add_feedback(self.story_id, 5.0, "Great coverage of the login flow")
+        self.helper._close_feedback_writer()  # Flush the background writer
+
+        metadata = self.helper.collection.get(ids=[self.story_id], include=['metadatas'])['metadatas'][0]
+        self.assertEqual(metadata['feedback_count'], 1)
+        self.assertEqual(metadata['feedback_score'], 5.0)
+
+    def test_improved_testcases_reach_knowledge_base(self):
+        improved = [{'id': 'TC-2', 'title': 'Locked account after 5 failed attempts'}]
+        self.helper.add_feedback(self.story_id, 4.5, "Missing lockout case", improved_testcases=improved)
+        self.helper._close_feedback_writer()
+
+        stored = self.helper.collection.get(where={"source": "user_improved"}, include=['metadatas'])
+        self.assertEqual(len(stored['ids']), 1)
+        self.assertEqual(stored['metadatas'][0]['original_story_id'], self.story_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+"""
+Figma response cache: byte accounting across inserts, replacements and LRU eviction
+
+Run from backend/: python -m unittest discover -s tests
+"""
+
+import importlib.util
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIGMA_DEPS_AVAILABLE = importlib.util.find_spec('requests') is not None
+
+
+@unittest.skipUnless(FIGMA_DEPS_AVAILABLE, "requests not installed")
+class FigmaResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        import figma_integration
+
+        self.module = figma_integration
+        self.figma = figma_integration.FigmaIntegration(access_token='test-token')
+
+    def tearDown(self):
+        self.figma._fetch_executor.shutdown(wait=False)
+
+    def _assert_bytes_consistent(self):
+        cached_bytes = sum(nbytes for _, _, nbytes in self.figma._response_cache.values())
+        self.assertEqual(self.figma._response_cache_bytes, cached_bytes)
+
+    def test_replacing_an_entry_counts_only_the_new_body(self):
+        self.figma._remember_response('https://x/a', 'etag-1', {'v': 1}, 100)
+        self.figma._remember_response('https://x/b', 'etag-1', {'v': 1}, 50)
+        self.figma._remember_response('https://x/a', 'etag-2', {'v': 2}, 300)
+
+        self.assertEqual(self.figma._response_cache_bytes, 350)
+        self.assertEqual(self.figma._response_cache['https://x/a'], ('etag-2', {'v': 2}, 300))
+        # The replaced entry is now the most recently used
+        self.assertEqual(list(self.figma._response_cache), ['https://x/b', 'https://x/a'])
+        self._assert_bytes_consistent()
+
+    def test_oversized_replacement_drops_the_old_entry(self):
+        with mock.patch.object(self.module, 'FIGMA_RESPONSE_CACHE_MAX_BYTES', 1000):
+            self.figma._remember_response('https://x/a', 'etag-1', {}, 400)
+            self.figma._remember_response('https://x/a', 'etag-2', {}, 1001)
+
+        self.assertNotIn('https://x/a', self.figma._response_cache)
+        self.assertEqual(self.figma._response_cache_bytes, 0)
+
+    def test_evicts_least_recently_used_past_byte_bound(self):
+        with mock.patch.object(self.module, 'FIGMA_RESPONSE_CACHE_MAX_BYTES', 1000):
+            self.figma._remember_response('https://x/a', 'e', {}, 400)
+            self.figma._remember_response('https://x/b', 'e', {}, 400)
+            self.figma._remember_response('https://x/a', 'e', {}, 400)  # Refreshes a
+            self.figma._remember_response('https://x/c', 'e', {}, 400)
+
+        self.assertEqual(list(self.figma._response_cache), ['https://x/a', 'https://x/c'])
+        self.assertEqual(self.figma._response_cache_bytes, 800)
+        self._assert_bytes_consistent()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+PDF extraction result cache: content-hash keys, hits/misses and LRU eviction by count and bytes
+
+Run from backend/: python -m unittest discover -s tests
+"""
+
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PDF_DEPS_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ('pdfplumber', 'pandas'))
+
+
+@unittest.skipUnless(PDF_DEPS_AVAILABLE, "pdfplumber / pandas not installed")
+class PDFCacheTest(unittest.TestCase):
+    def setUp(self):
+        import enhanced_pdf_helper
+
+        self.module = enhanced_pdf_helper
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.processor = enhanced_pdf_helper.EnhancedPDFProcessor()
+        self.processor.cache_dir = os.path.join(self._tmp_dir.name, 'cache')
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def _write_pdf(self, name: str, content: bytes) -> str:
+        path = os.path.join(self._tmp_dir.name, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def _entry_path(self, cache_key: str) -> str:
+        return os.path.join(self.processor.cache_dir, f"{cache_key}.json")
+
+    def _save(self, cache_key: str, mtime: float = None):
+        self.processor._save_cached_result(cache_key, {'text_content': 'x' * 1000, 'tables': []})
+        if mtime is not None:
+            os.utime(self._entry_path(cache_key), (mtime, mtime))
+
+    def test_key_depends_on_content_and_settings(self):
+        first = self._write_pdf('a.pdf', b'%PDF-1.4 one')
+        same_content = self._write_pdf('b.pdf', b'%PDF-1.4 one')
+        other_content = self._write_pdf('c.pdf', b'%PDF-1.4 two')
+
+        key = self.processor._cache_key(first)
+        self.assertEqual(key, self.processor._cache_key(same_content))
+        self.assertNotEqual(key, self.processor._cache_key(other_content))
+
+        text_tables = self.module.EnhancedPDFProcessor(table_settings='text')
+        self.assertNotEqual(key, text_tables._cache_key(first))
+
+    def test_miss_then_hit(self):
+        self.assertIsNone(self.processor._load_cached_result('missing'))
+
+        result = {'text_content': 'hello', 'tables': [{'page': 1, 'text_representation': 'a|b\n'}]}
+        self.processor._save_cached_result('key', result)
+        self.assertEqual(self.processor._load_cached_result('key'), result)
+
+    def test_corrupt_entry_is_a_miss(self):
+        os.makedirs(self.processor.cache_dir)
+        with open(self._entry_path('broken'), 'w') as f:
+            f.write('{not json')
+        self.assertIsNone(self.processor._load_cached_result('broken'))
+
+    def test_evicts_least_recently_used_past_entry_count(self):
+        with mock.patch.object(self.module, 'PDF_CACHE_MAX_ENTRIES', 2):
+            self._save('a', mtime=100)
+            self._save('b', mtime=200)
+            # A hit refreshes 'a', so 'b' is now the least recently used
+            self.assertIsNotNone(self.processor._load_cached_result('a'))
+            self._save('c')
+
+        self.assertTrue(os.path.exists(self._entry_path('a')))
+        self.assertFalse(os.path.exists(self._entry_path('b')))
+        self.assertTrue(os.path.exists(self._entry_path('c')))
+
+    def test_evicts_least_recently_used_past_byte_bound(self):
+        self._save('probe')
+        entry_bytes = os.path.getsize(self._entry_path('probe'))
+        os.remove(self._entry_path('probe'))
+
+        with mock.patch.object(self.module, 'PDF_CACHE_MAX_BYTES', entry_bytes * 2 + entry_bytes // 2):
+            self._save('a', mtime=100)
+            self._save('b', mtime=200)
+            self._save('c')
+
+        self.assertFalse(os.path.exists(self._entry_path('a')))
+        self.assertTrue(os.path.exists(self._entry_path('b')))
+        self.assertTrue(os.path.exists(self._entry_path('c')))
+
+
+if __name__ == '__main__':
+    unittest.main()
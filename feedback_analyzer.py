@@ -8,11 +8,11 @@ import json
 import sys
 from datetime import datetime, timedelta
 from collections import defaultdict
-from backend.enhanced_rag_helper import rag_helper
+from backend.enhanced_rag_helper import get_rag_helper
 
 class FeedbackAnalyzer:
     def __init__(self):
-        self.rag_helper = rag_helper
+        self.rag_helper = get_rag_helper()
     
     def analyze_feedback_patterns(self) -> dict:
         """Comprehensive feedback analysis"""